@@ -21,7 +21,10 @@ Part of the pyemf library for handling EMF format files
  Boston, MA  02110-1301, USA.
 """
 from .constants import *
-from .emf import EMF
+from .emf import EMF, iterRecords
+from .index import RecordIndex
+from .spatial import SpatialIndex
+from .probe import probe, MetafileInfo
 
 #from matplotlib.backend_bases import register_backend
 #register_backend('emf', 'pyemf', 'EMF File Format')
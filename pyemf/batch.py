@@ -0,0 +1,300 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+"""
+Process many metafiles at once, spread over several processes.
+
+Each file is loaded in a worker process and only a small summary dict
+is sent back, so no record objects are ever pickled.  From the command
+line::
+
+  python -m pyemf.batch -j 8 -a convert -o out/ drawings/
+
+"""
+
+from __future__ import print_function, division
+
+from builtins import object
+import os
+import sys
+import time
+
+from .emf import EMF
+from .wmf import WMF
+from .probe import probe
+
+# what batch() can do with each file
+ACTIONS = ('probe', 'summary', 'convert')
+
+EXTENSIONS = ('.emf', '.wmf', '.emz', '.wmz')
+
+
+def _walk(paths):
+    """Generator of (filename, relative name) for the metafiles named by
+    paths, see L{findFiles}.  The relative name of a file found in a
+    directory is its path below that directory, and that of a file
+    given directly is its base name."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(EXTENSIONS):
+                        filename = os.path.join(dirpath, name)
+                        yield (filename, os.path.relpath(filename, path))
+        else:
+            yield (path, os.path.basename(path))
+
+
+def findFiles(paths):
+    """Return the metafiles named by paths.  Directories are searched
+    recursively for files ending in .emf, .wmf or the compressed .emz
+    and .wmz (in any case)."""
+    return [filename for (filename, relname) in _walk(paths)]
+
+
+def _outputs(paths, outdir):
+    """Return (filename, output filename) for the files to convert.  A
+    file keeps its path relative to the directory it was found in, so
+    files of the same name in different subdirectories don't overwrite
+    each other.
+
+    @raise ValueError: if two files would still be written to the same
+    output"""
+    jobs = []
+    seen = {}
+    for (filename, relname) in _walk(paths):
+        output = os.path.normpath(os.path.join(outdir, relname))
+        key = os.path.normcase(output)
+        if key in seen:
+            raise ValueError("%s and %s would both be converted to %s" %
+                             (seen[key], filename, output))
+        seen[key] = filename
+        jobs.append((filename, output))
+    return jobs
+
+
+def _summary(info, records=None):
+    """Convert a L{MetafileInfo} and an optional record list into the
+    dict returned by the workers."""
+    result = {
+        'filename': info.filename,
+        'format': 'wmf' if info.wmf else 'emf',
+        'bounds': info.bounds,
+        'nBytes': info.nBytes,
+        'nRecords': info.nRecords,
+        'nHandles': info.nHandles,
+        'description': info.description,
+    }
+    if records is not None:
+        result['nRecords'] = len(records)
+        counts = {}
+        for e in records:
+            name = e.__class__.__name__.lstrip('_')
+            counts[name] = counts.get(name, 0) + 1
+        result['counts'] = counts
+    return result
+
+
+def processFile(filename, action='summary', outdir=None, output=None):
+    """
+Handle a single file for L{batch}.  This runs in the worker processes,
+and never raises: errors are returned in the 'error' entry.
+
+@param filename: metafile to process
+@param action: one of L{ACTIONS}
+@param outdir: directory the converted file is written to, under the
+same base name
+@param output: name of the converted file, used instead of outdir
+@return: summary dict with at least 'filename', 'size' and 'error'
+@rtype: dict
+    """
+    try:
+        size = os.path.getsize(filename)
+        info = probe(filename)
+        if action == 'probe':
+            result = _summary(info)
+        else:
+            doc = WMF() if info.wmf else EMF()
+            doc.load(filename)
+            result = _summary(info, doc.records)
+            if action == 'convert':
+                if output is None:
+                    output = os.path.join(outdir, os.path.basename(filename))
+                dirname = os.path.dirname(output)
+                if dirname and not os.path.isdir(dirname):
+                    try:
+                        os.makedirs(dirname)
+                    except OSError:
+                        # another worker may have just made it
+                        if not os.path.isdir(dirname):
+                            raise
+                if not doc.save(output):
+                    raise IOError("couldn't write %s" % output)
+                result['output'] = output
+        result['size'] = size
+        result['error'] = None
+    except Exception as e:
+        result = {'filename': filename, 'size': 0,
+                  'error': "%s: %s" % (e.__class__.__name__, e)}
+    return result
+
+
+def _processJob(job):
+    return processFile(*job)
+
+
+class BatchReport(object):
+
+    """
+Results of a L{batch} run: the list of per-file summary dicts in input
+order, and the throughput.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def add(self, result):
+        self.results.append(result)
+        self.files += 1
+        self.bytes += result['size']
+        if result['error']:
+            self.errors += 1
+
+    def filesPerSecond(self):
+        if self.seconds <= 0:
+            return 0.0
+        return self.files / self.seconds
+
+    def megabytesPerSecond(self):
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / (1024.0 * 1024.0) / self.seconds
+
+    def __str__(self):
+        return "%d files (%d errors), %.1f MB in %.2fs: %.1f files/s, %.2f MB/s" % (
+            self.files, self.errors, self.bytes / (1024.0 * 1024.0),
+            self.seconds, self.filesPerSecond(), self.megabytesPerSecond())
+
+
+def batch(paths, action='summary', outdir=None, workers=None, chunksize=8,
+          callback=None):
+    """
+Load, probe or convert many metafiles using a pool of worker processes.
+
+@param paths: files and directories to process, see L{findFiles}
+@type paths: list
+@param action: 'probe' reads only the headers (see L{probe}),
+'summary' fully loads each file and counts its records by type, and
+'convert' also saves the loaded file into outdir.
+@type action: string
+@param outdir: output directory for 'convert'; created if missing.
+Files found in a directory keep their path below it.
+@type outdir: string
+@param workers: number of worker processes; None uses one per CPU,
+and 0 or 1 processes the files in this process.
+@type workers: int
+@param chunksize: number of files handed to a worker at a time
+@type chunksize: int
+@param callback: optional function called with each summary dict as
+soon as it arrives, e.g. to show progress
+@return: the summaries and throughput
+@rtype: L{BatchReport}
+@raise ValueError: for an unknown action, or if two files would be
+converted to the same output file
+    """
+    if action not in ACTIONS:
+        raise ValueError("action must be one of %s" % ", ".join(ACTIONS))
+    if action == 'convert':
+        if not outdir:
+            raise ValueError("convert needs an output directory")
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+    if action == 'convert':
+        jobs = [(filename, action, outdir, output)
+                for (filename, output) in _outputs(paths, outdir)]
+    else:
+        jobs = [(filename, action, outdir) for filename in findFiles(paths)]
+    report = BatchReport()
+    start = time.time()
+    if workers is not None and workers <= 1:
+        results = map(_processJob, jobs)
+        executor = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_processJob, jobs,
+                               chunksize=max(1, chunksize))
+    try:
+        for result in results:
+            report.add(result)
+            if callback is not None:
+                callback(result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    report.seconds = time.time() - start
+    return report
+
+
+def main(argv=None):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] files-or-directories...")
+    parser.add_option("-a", "--action", dest="action", default="summary",
+                      choices=ACTIONS,
+                      help="one of %s [default: %%default]" % ", ".join(ACTIONS))
+    parser.add_option("-o", "--outdir", dest="outdir", default=None,
+                      help="output directory for the convert action")
+    parser.add_option("-j", "--workers", dest="workers", type="int",
+                      default=None, help="worker processes [default: one per CPU]")
+    parser.add_option("-c", "--chunksize", dest="chunksize", type="int",
+                      default=8, help="files per task [default: %default]")
+    parser.add_option("-q", action="store_true", dest="quiet", default=False,
+                      help="only print the throughput")
+    (options, args) = parser.parse_args(argv)
+    if not args:
+        parser.error("no files given")
+
+    def show(result):
+        if result['error']:
+            print("%s: ERROR %s" % (result['filename'], result['error']))
+        elif not options.quiet:
+            print("%s: %s %d bytes, %s records, %d handles, bounds=%s" % (
+                result['filename'], result['format'].upper(),
+                result['nBytes'], result['nRecords'], result['nHandles'],
+                result['bounds']))
+
+    try:
+        report = batch(args, options.action, options.outdir, options.workers,
+                       options.chunksize, show)
+    except ValueError as e:
+        parser.error(str(e))
+    print(report)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
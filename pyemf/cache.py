@@ -0,0 +1,94 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+from __future__ import print_function, division
+
+from builtins import object
+from collections import OrderedDict
+
+
+class ObjectCache(object):
+
+    """
+Live graphics objects (pens, brushes, fonts) by their creation
+parameters, so that creating an object that already exists can return
+its handle instead of writing another creation record.  The objects
+are kept in least recently used order; when there are more than the
+budget, the least recently used ones that aren't selected are evicted
+and must be deleted by the caller.
+    """
+
+    def __init__(self):
+        # key -> handle, least recently used first
+        self.handles = OrderedDict()
+        # handle -> key
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __contains__(self, handle):
+        return handle in self.keys
+
+    def lookup(self, key):
+        """Return the handle of the live object created with key, or
+        None.  A hit makes it the most recently used object."""
+        handle = self.handles.pop(key, None)
+        if handle is not None:
+            self.handles[key] = handle
+        return handle
+
+    def add(self, key, handle):
+        """Remember a newly created object."""
+        self.handles[key] = handle
+        self.keys[handle] = key
+
+    def remove(self, handle):
+        """Forget an object, e.g. because it has been deleted."""
+        key = self.keys.pop(handle, None)
+        if key is not None:
+            del self.handles[key]
+
+    def evict(self, budget, inuse=()):
+        """
+Forget least recently used objects until there are fewer than budget,
+leaving room for one more.  Objects in use (selected, or selected in a
+saved state) are never evicted, so the cache may stay over budget if
+all of them are in use.
+
+@param budget: largest number of cached objects
+@type budget: int
+@param inuse: handles that must not be evicted
+@return: the evicted handles, which are still in the handle table
+@rtype: list
+        """
+        evicted = []
+        excess = len(self.handles) - budget + 1
+        if excess <= 0:
+            return evicted
+        for key, handle in list(self.handles.items()):
+            if handle in inuse:
+                continue
+            evicted.append(handle)
+            del self.handles[key]
+            del self.keys[handle]
+            if len(evicted) == excess:
+                break
+        return evicted
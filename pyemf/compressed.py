@@ -0,0 +1,135 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+"""
+Reading and writing gzip compressed metafiles (.emz and .wmz).
+
+Compressed files are recognized by the gzip signature at the start of
+the data rather than by name, so a renamed file still loads.  When
+saving, a name ending in .emz or .wmz, or an explicit compression
+level, selects compression.  Data is decompressed and compressed in
+chunks as the records are read or written, so the uncompressed
+metafile is never held in memory as a whole.
+"""
+
+from __future__ import print_function, division
+
+import gzip
+import io
+
+from .compat import *
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+EXTENSIONS = ('.emz', '.wmz')
+
+# size of the reads from the decompressor, and of the buffer records are
+# packed into before being handed to the compressor
+CHUNK_SIZE = 1 << 20
+
+# zlib's own default: most of the compression of level 9 at a fraction
+# of the time
+COMPRESS_LEVEL = 6
+
+
+def isCompressed(source):
+    """Return True if the named file, the buffer, or the rest of the
+    file-like object starts with the gzip signature.  A file-like
+    object is left at the same position; one that can be neither
+    sought nor peeked into is taken to be uncompressed."""
+    if isinstance(source, (str, cunicode)) or hasattr(source, '__fspath__'):
+        fh = open(source, 'rb')
+        try:
+            source = fh.read(2)
+        finally:
+            fh.close()
+    elif hasattr(source, 'read'):
+        if hasattr(source, 'seekable') and source.seekable():
+            pos = source.tell()
+            magic = source.read(2)
+            source.seek(pos)
+        elif hasattr(source, 'peek'):
+            magic = source.peek(2)[:2]
+        else:
+            return False
+        return magic == GZIP_MAGIC
+    return bytes(memoryview(source)[:2]) == GZIP_MAGIC
+
+
+def wantsCompression(filename, compresslevel=None):
+    """Return True if a file of this name should be written
+    compressed: the name ends in .emz or .wmz, or a compression level
+    is given."""
+    if compresslevel is not None:
+        return True
+    return str(filename).lower().endswith(EXTENSIONS)
+
+
+def openRead(filename, chunksize=None):
+    """
+Open a metafile for sequential reading.  A compressed file is returned
+as a buffered decompressing reader that pulls chunksize bytes from the
+decompressor at a time; anything else is simply opened in binary mode.
+
+@param filename: file to open
+@type filename: string
+@param chunksize: read size for compressed files, default L{CHUNK_SIZE}
+@type chunksize: int
+@return: file-like object
+    """
+    if not isCompressed(filename):
+        return open(filename, 'rb')
+    return io.BufferedReader(gzip.GzipFile(filename, 'rb'),
+                             chunksize or CHUNK_SIZE)
+
+
+def openBuffer(membuf, chunksize=None):
+    """Return a decompressing reader for compressed data held in
+    memory, or read from a file-like object opened in binary mode, see
+    L{openRead}.  Closing the reader leaves a file-like object open."""
+    if not hasattr(membuf, 'read'):
+        membuf = BytesIO(membuf)
+    return io.BufferedReader(gzip.GzipFile(fileobj=membuf, mode='rb'),
+                             chunksize or CHUNK_SIZE)
+
+
+def openWrite(filename, compresslevel=None):
+    """
+Open a file for writing, compressed if L{wantsCompression} says so.
+
+@param filename: file to write, or a file-like object opened in binary
+mode.  A file-like object is only wrapped in a compressor, and closing
+the result leaves it open.
+@type filename: string or file
+@param compresslevel: 0 (stored) to 9 (smallest); default
+L{COMPRESS_LEVEL} for compressed names, uncompressed otherwise
+@type compresslevel: int
+@return: file-like object
+    """
+    if hasattr(filename, 'write'):
+        if compresslevel is None:
+            compresslevel = COMPRESS_LEVEL
+        return gzip.GzipFile(fileobj=filename, mode='wb',
+                             compresslevel=compresslevel)
+    if not wantsCompression(filename, compresslevel):
+        return open(filename, 'wb')
+    if compresslevel is None:
+        compresslevel = COMPRESS_LEVEL
+    return gzip.GzipFile(filename, 'wb', compresslevel)
@@ -23,6 +23,27 @@ from __future__ import print_function, division
 from builtins import object
 from .utils import RGB
 
+# kind of graphics object made by each object creation record (by
+# iType), and of each stock object; objects of one kind replace each
+# other when selected
+_OBJECT_KINDS = {
+    38: 'pen',  # CREATEPEN
+    95: 'pen',  # EXTCREATEPEN
+    39: 'brush',  # CREATEBRUSHINDIRECT
+    93: 'brush',  # CREATEMONOBRUSH
+    94: 'brush',  # CREATEDIBPATTERNBRUSHPT
+    82: 'font',  # EXTCREATEFONTINDIRECTW
+    49: 'palette',  # CREATEPALETTE
+}
+_STOCK_KINDS = {
+    0: 'brush', 1: 'brush', 2: 'brush', 3: 'brush', 4: 'brush', 5: 'brush',
+    6: 'pen', 7: 'pen', 8: 'pen',
+    10: 'font', 11: 'font', 12: 'font', 13: 'font', 14: 'font',
+    15: 'palette', 16: 'font', 17: 'font',
+    18: 'brush', 19: 'pen',  # DC_BRUSH, DC_PEN
+}
+_STOCK_BIT = 0x80000000
+
 
 class _DC(object):
 
@@ -118,6 +139,15 @@ class _DC(object):
         self.window_ext_x = self.pixelwidth
         self.window_ext_y = self.pixelheight
 
+        # drawing state as far as it is known, used to spot records
+        # that don't change anything: the handle selected for each
+        # kind of object, the value set by each mode setting record
+        # (by iType), and the states saved by SaveDC.  Nothing is known
+        # until it is set.
+        self.selected = {}
+        self.modes = {}
+        self.savedstates = []
+
     def getBounds(self, header):
         """Extract the dimensions from an _EMR._HEADER record."""
 
@@ -203,3 +233,72 @@ class _DC(object):
     def popObject(self):
         """Remove last object.  Used mainly in case of error."""
         self.objects.pop()
+
+    def objectKind(self, handle):
+        """Return 'pen', 'brush', 'font' or 'palette' for the object
+        with this handle, or None if it isn't known."""
+        if handle & _STOCK_BIT:
+            return _STOCK_KINDS.get(handle & ~_STOCK_BIT)
+        if 0 < handle < len(self.objects) and self.objects[handle] is not None:
+            return _OBJECT_KINDS.get(self.objects[handle].iType)
+        return None
+
+    def isSelected(self, handle):
+        """Return True if the object with this handle is known to be
+        selected already, so selecting it again changes nothing."""
+        kind = self.objectKind(handle)
+        return kind is not None and self.selected.get(kind) == handle
+
+    def selectObject(self, handle):
+        """Record the selection of an object."""
+        kind = self.objectKind(handle)
+        if kind is None:
+            # can't tell what it replaced
+            self.selected = {}
+        else:
+            self.selected[kind] = handle
+
+    def forgetObject(self, handle):
+        """Forget that handle is selected, because it was deleted or
+        now refers to a new object."""
+        for kind, selected in list(self.selected.items()):
+            if selected == handle:
+                del self.selected[kind]
+
+    def selectedHandles(self):
+        """Return the set of handles known to be selected, now or in a
+        state saved by SaveDC."""
+        handles = set(self.selected.values())
+        for (selected, modes) in self.savedstates:
+            handles.update(selected.values())
+        return handles
+
+    def hasMode(self, key, value):
+        """Return True if the mode is known to have this value."""
+        return key in self.modes and self.modes[key] == value
+
+    def setMode(self, key, value):
+        """Record a mode setting."""
+        self.modes[key] = value
+
+    def saveState(self):
+        """Push the known state, as SaveDC does."""
+        self.savedstates.append((dict(self.selected), dict(self.modes)))
+
+    def restoreState(self, relative=-1):
+        """Go back to a saved state, as RestoreDC does.  A negative
+        relative counts back from the most recent save, a positive one
+        is the number of the save.  If that state isn't known, nothing
+        is known afterwards."""
+        count = len(self.savedstates)
+        if relative < 0:
+            index = count + relative
+        else:
+            index = relative - 1
+        if index < 0 or index >= count:
+            self.savedstates = []
+            self.selected = {}
+            self.modes = {}
+            return
+        (self.selected, self.modes) = self.savedstates[index]
+        del self.savedstates[index:]
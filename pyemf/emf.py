@@ -24,12 +24,252 @@ from builtins import range
 from builtins import object
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from .constants import *
 from .dc import _DC
-from .utils import _normalizeColor
+from .utils import _normalizeColor, _isNumpy, _pointBounds, _useShort
 from . import emr
 from .compat import *
 from .record import _EMR_UNKNOWN
+from .field import struct_pack
+from .index import RecordIndex, mapFile
+from .probe import probe
+from .spatial import SpatialIndex, recordBounds, _TextState
+from .simplify import simplify, simplifyParts, simplifyRecords
+from .optimize import Coalescer, StateFilter, coalesce, dropRedundant
+from .cache import ObjectCache
+from .compressed import isCompressed, wantsCompression, openRead, \
+    openBuffer, openWrite, CHUNK_SIZE
+
+
+def _recordClass(iType):
+    """Return the record class registered for iType, or
+    L{_EMR_UNKNOWN} if the type isn't known."""
+    if iType in emr._emrmap:
+        return emr._emrmap[iType]
+    print('Unknown iType', repr(iType))
+    return _EMR_UNKNOWN
+
+
+def _alwaysDecoded():
+    """Record types that are decoded even when filtered out: the
+    header and EOF, which every EMF needs, and the records that create
+    or delete graphics objects, so the handle table stays complete."""
+    keep = set([emr._HEADER.emr_id, emr._EOF.emr_id,
+                emr._DELETEOBJECT.emr_id])
+    base = _EMR_UNKNOWN.__dict__['hasHandle']
+    for iType, cls in emr._emrmap.items():
+        for klass in cls.__mro__:
+            if 'hasHandle' in klass.__dict__:
+                if klass.__dict__['hasHandle'] is not base:
+                    keep.add(iType)
+                break
+    return keep
+
+
+def _typeFilter(include=None, exclude=None):
+    """Return a function telling whether records of a given iType
+    should be decoded, or None if all of them should be.  Types may be
+    given as record classes (e.g. emr._EXTTEXTOUTW) or iType numbers."""
+    if include is None and exclude is None:
+        return None
+
+    def ids(types):
+        if isinstance(types, (int, type)):
+            types = [types]
+        return set(t if isinstance(t, int) else t.emr_id for t in types)
+
+    keep = _alwaysDecoded()
+    if include is not None:
+        wanted = ids(include) | keep
+        if exclude is not None:
+            wanted -= ids(exclude) - keep
+        return wanted.__contains__
+    unwanted = ids(exclude) - keep
+    return lambda iType: iType not in unwanted
+
+
+def _skip(fh, count):
+    """Move past count bytes of a file-like object, seeking if
+    possible so the bytes are never read."""
+    if count <= 0:
+        return
+    seekable = getattr(fh, 'seekable', None)
+    if seekable is not None and seekable():
+        fh.seek(count, 1)
+    else:
+        fh.read(count)
+
+
+def _readRecords(fh, verbose=False, arraytype=None, wanted=None,
+                 placeholders=False):
+    """Generator that reads the records of an EMF one at a time from
+    a file-like object.  Records whose iType fails the wanted test are
+    skipped, or returned undecoded as L{_EMR_UNKNOWN} placeholders
+    holding the raw record if placeholders is True."""
+    try:
+        count = 1
+        while count > 0:
+            data = fh.read(8)
+            count = len(data)
+            if count > 0:
+                (iType, nSize) = struct.unpack("<ii", data)
+                if verbose:
+                    print("EMF:  iType=%d nSize=%d" % (iType, nSize))
+
+                if wanted is not None and not wanted(iType):
+                    if placeholders:
+                        e = _EMR_UNKNOWN()
+                        e.unserialize(fh, data, iType, nSize)
+                        yield e
+                    else:
+                        _skip(fh, nSize - 8)
+                    continue
+
+                e = _recordClass(iType)()
+                if arraytype:
+                    e.arraytype = arraytype
+                e.unserialize(fh, data, iType, nSize)
+                yield e
+
+    except EOFError:
+        pass
+
+
+def _readRecordsBuffer(view, verbose=False, lazy=False, arraytype=None,
+                       wanted=None, placeholders=False):
+    """Generator that decodes the records of an EMF held in a
+    memoryview.  Each record is unpacked from a slice of the view, so
+    the underlying buffer is never copied.  If lazy is True, only the
+    record headers are read and the records are decoded on first
+    use.  Records whose iType fails the wanted test are skipped, or
+    returned as lazy records if placeholders is True."""
+    ptr = 0
+    end = len(view)
+    while ptr < end:
+        (iType, nSize) = struct.unpack_from("<ii", view, ptr)
+        if verbose:
+            print("EMF:  iType=%d nSize=%d" % (iType, nSize))
+
+        if wanted is not None and not wanted(iType):
+            if placeholders:
+                yield _recordClass(iType).createLazy(view, ptr, iType, nSize,
+                                                     arraytype)
+            ptr += max(nSize, 8)
+            continue
+
+        cls = _recordClass(iType)
+        if lazy:
+            e = cls.createLazy(view, ptr, iType, nSize, arraytype)
+        else:
+            e = cls()
+            if arraytype:
+                e.arraytype = arraytype
+            e.unserialize(None, view[ptr:ptr + nSize], iType, nSize, 8)
+        # a record can never be shorter than its own header; this
+        # also guarantees progress on corrupt files
+        ptr += max(nSize, 8)
+        yield e
+
+
+def _trackHandles(dc, e):
+    """Update the handle table of dc for a record that has just been
+    read."""
+    if e.hasHandle():
+        dc.addObject(e, e.handle)
+    elif isinstance(e, emr._DELETEOBJECT):
+        dc.removeObject(e.handle)
+
+
+def _decodeChunk(job):
+    """Decode the records between two offsets of an EMF file.  This
+    runs in the worker processes of L{EMF.load} with workers > 1.  The
+    records are decoded from a copy of the bytes rather than from a
+    memory map, so that they can be pickled."""
+    (filename, start, end, arraytype, include, exclude, placeholders) = job
+    fh = open(filename, 'rb')
+    try:
+        fh.seek(start)
+        data = fh.read(end - start)
+    finally:
+        fh.close()
+    records = list(_readRecords(BytesIO(data), False, arraytype,
+                                _typeFilter(include, exclude), placeholders))
+    # the raw record bytes are only needed while unserializing; don't
+    # send them back to the parent a second time
+    for e in records:
+        e.data = None
+    return records
+
+
+def _chunkBounds(index, chunks):
+    """Split the records of a L{RecordIndex} into at most chunks
+    contiguous runs of roughly equal byte size, returned as a list of
+    (start, end) file offsets."""
+    from bisect import bisect_left
+    offsets = index.offsets
+    last = len(offsets) - 1
+    end = offsets[last] + max(index.sizes[last], 8)
+    bounds = []
+    start = 0
+    for i in range(1, chunks + 1):
+        if i == chunks:
+            stop = end
+        else:
+            stop = offsets[min(bisect_left(offsets, end * i // chunks), last)]
+        if stop > start:
+            bounds.append((start, stop))
+            start = stop
+    return bounds
+
+
+def iterRecords(source, dc=None, arrays=None, include=None, exclude=None):
+    """
+Read an EMF one record at a time.  This is a generator that yields
+each decoded record as soon as it has been read and keeps no reference
+to it, so arbitrarily large files can be processed in constant memory.
+
+@param source: filename, file-like object opened in binary mode, or
+any object supporting the buffer protocol (bytes, mmap, ...), gzip
+compressed or not
+@param dc: optional device context, e.g. the dc attribute of an L{EMF},
+whose handle table is kept up to date as records go by: objects are
+added when their creation record is read and removed on
+DeleteObject, so dc.objects[handle] is always the live record.
+@param arrays: how variable length point lists are decoded, see
+L{EMF.load}.
+@type arrays: string
+@param include: only yield records of these types, see L{EMF.load}.
+@param exclude: don't yield records of these types, see L{EMF.load}.
+@return: generator of records
+    """
+    if arrays is True:
+        arrays = 'array'
+    wanted = _typeFilter(include, exclude)
+    fh = None
+    if isinstance(source, (str, cunicode)) or hasattr(source, '__fspath__'):
+        fh = openRead(source)
+        source = fh
+    elif isCompressed(source):
+        fh = openBuffer(source)
+        source = fh
+    try:
+        if hasattr(source, 'read'):
+            reader = _readRecords(source, arraytype=arrays, wanted=wanted)
+        else:
+            reader = _readRecordsBuffer(memoryview(source).cast('B'),
+                                        arraytype=arrays, wanted=wanted)
+        for e in reader:
+            if dc is not None:
+                _trackHandles(dc, e)
+            yield e
+    finally:
+        if fh is not None:
+            fh.close()
 
 
 class EMF(object):
@@ -38,7 +278,7 @@ class EMF(object):
 Reference page of the public API for enhanced metafile creation.  See
 L{pyemf} for an overview / mini tutorial.
 
-@group Creating Metafiles: __init__, load, save
+@group Creating Metafiles: __init__, load, loadIndex, record, patch, save, tobytes, stream, append, close, getDrawingBounds, recordsInRect, simplify, optimize
 @group Drawing Parameters: GetStockObject, SelectObject, DeleteObject, CreatePen, CreateSolidBrush, CreateHatchBrush, SetBkColor, SetBkMode, SetPolyFillMode
 @group Drawing Primitives: SetPixel, Polyline, PolyPolyline, Polygon, PolyPolygon, Rectangle, RoundRect, Ellipse, Arc, Chord, Pie, PolyBezier
 @group Path Primatives: BeginPath, EndPath, MoveTo, LineTo, PolylineTo, ArcTo,
@@ -80,6 +320,41 @@ integer coordinates.
         self.filename = None
         self.dc = _DC(width, height, density, units)
         self.records = []
+        # RecordIndex used by record() after loadIndex()
+        self.index = None
+
+        # output file while streaming, see stream(), and the optimizer
+        # stages the records pass through on their way to it
+        self._stream = None
+        self._stages = []
+        self._appending = False
+
+        # running bounds of the current path, covering the records
+        # from pathstart up to _pathend; see _getPathBounds().  They are
+        # only kept between BeginPath and the call that uses the path.
+        self._pathbounds = None
+        self._pathend = 0
+        self._pathopen = False
+
+        # union of the bounds of everything drawn, covering the records
+        # up to _drawend, and the font and text alignment in use there
+        # for estimating the extent of text; see getDrawingBounds()
+        self._drawbounds = None
+        self._drawend = 0
+        self._textstate = _TextState()
+
+        # SpatialIndex used by recordsInRect(), and the number of
+        # records it covers
+        self._spatial = None
+        self._spatialend = 0
+
+        # the record list the running bounds and spatial index were
+        # built from; if self.records is replaced they are rebuilt, see
+        # _changed()
+        self._tracked = self.records
+
+        # record offsets of the loaded file, see patch()
+        self._patchindex = None
 
         # path recordkeeping
         self.pathstart = 0
@@ -90,6 +365,23 @@ integer coordinates.
         # using MapMode or SetWindow/SetViewport.
         self.scaleheader = True
 
+        # if True, the header bounds and frame are set to the area
+        # actually drawn (see getDrawingBounds) rather than the page
+        self.fitheader = False
+
+        # if set, Polyline, Polygon, PolyPolyline and PolyPolygon drop
+        # points closer than this many logical units to the simplified
+        # line; see simplify()
+        self.simplifytolerance = None
+
+        # if set, CreatePen, CreateSolidBrush, CreateHatchBrush and
+        # CreateFont return the handle of a live object made with the
+        # same parameters rather than creating another, keeping at most
+        # this many of them; see DeleteObject() for what that means for
+        # the handles, and _appendCached()
+        self.objectbudget = None
+        self._objectcache = ObjectCache()
+
         hdr = emr._HEADER(description)
         self._append(hdr)
         if not self.scaleheader:
@@ -100,94 +392,689 @@ integer coordinates.
                     self.dc.ref_pixelwidth / self.dc.ref_width),
                 int(self.dc.height / 100.0 * self.dc.ref_pixelheight / self.dc.ref_height))
 
-    def loadmem(self, membuf=None):
+    def loadmem(self, membuf=None, lazy=False, arrays=None, include=None,
+                exclude=None, placeholders=False):
         """
 Read an existing buffer from a string of bytes.  If any records exist
 in the current object, they will be overwritten by the records from
 this buffer.
 
+Any object supporting the buffer protocol (bytes, bytearray, mmap,
+memoryview, ...) is accepted.  Records are decoded directly from
+slices of the buffer without copying it, so any record data that
+isn't parsed into fields keeps a reference to the buffer.  Gzip
+compressed (.emz) data is decompressed as it is read.
+
 @param membuf: buffer to load
-@type membuf: string
+@type membuf: string or buffer
+@param lazy: if True, only scan the record headers; each record is
+decoded the first time one of its fields is accessed.
+@type lazy: Boolean
+@param arrays: how variable length point and integer lists (e.g. the
+points of a polyline) are decoded.  None gives the usual lists of
+lists; 'array' (or True) stores them in compact array.array based
+L{PointArray}s and 'numpy' in numpy arrays, decoding each list with a
+single call.  Both array forms can be indexed, iterated and changed
+in place like lists.
+@type arrays: string
+@param include: record types to decode, see L{load}.
+@param exclude: record types to skip, see L{load}.
+@param placeholders: keep skipped records, see L{load}.
+@type placeholders: Boolean
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
-        fh = BytesIO(membuf)
-        self._load(fh)
-
-    def load(self, filename=None):
+        self.index = None
+        wanted = _typeFilter(include, exclude)
+        if isCompressed(membuf):
+            fh = openBuffer(membuf)
+            if lazy:
+                # lazy records need the whole file in one buffer
+                self._load(memoryview(fh.read()), lazy, arrays, wanted,
+                           placeholders)
+            else:
+                self._load(fh, False, arrays, wanted, placeholders)
+            return
+        self._load(memoryview(membuf).cast('B'), lazy, arrays, wanted,
+                   placeholders)
+
+    def load(self, filename=None, mmap=False, lazy=False, arrays=None,
+             include=None, exclude=None, placeholders=False, workers=None,
+             chunksize=None):
         """
 Read an existing EMF file.  If any records exist in the current
 object, they will be overwritten by the records from this file.
 
+Gzip compressed files (.emz) are recognized by their contents and
+decompressed in chunks while the records are read.  Such files can't
+be memory-mapped, so for mmap or lazy loads they are decompressed into
+memory first, and workers is ignored.
+
 @param filename: filename to load
 @type filename: string
+@param mmap: if True, memory-map the file and decode the records in
+place rather than reading them into memory.  The map stays open as
+long as any record refers to it.
+@type mmap: Boolean
+@param lazy: if True, only scan the record headers; each record is
+decoded the first time one of its fields is accessed.  Records that
+define graphics object handles are always decoded so the handle table
+is complete.  Implies mmap.
+@type lazy: Boolean
+@param arrays: how variable length point and integer lists (e.g. the
+points of a polyline) are decoded.  None gives the usual lists of
+lists; 'array' (or True) stores them in compact array.array based
+L{PointArray}s and 'numpy' in numpy arrays, decoding each list with a
+single call.  Both array forms can be indexed, iterated and changed
+in place like lists.
+@type arrays: string
+@param include: if given, only records of these types are decoded.
+Types are record classes (e.g. emr._EXTTEXTOUTW) or iType numbers.
+All other records are skipped without being read into Python objects.
+The header, EOF and the records that create or delete graphics
+objects are always decoded.
+@type include: list
+@param exclude: record types to skip; the opposite of include.
+@type exclude: list
+@param placeholders: if True, skipped records are kept in the record
+list rather than dropped, so the file can be saved again unchanged.
+When reading a file they are L{_EMR_UNKNOWN} records holding the raw
+record data; when the file is memory-mapped they are lazy records
+that are only decoded if accessed.
+@type placeholders: Boolean
+@param workers: if more than 1, the file is split at record
+boundaries into chunks that are decoded by this many worker
+processes.  The handle table is then rebuilt in record order.  Ignored
+for lazy loads.  The gain is limited whatever the number of workers:
+the records are pickled back to this process, and unpickling them one
+after another takes this process roughly half to two thirds of the
+time of decoding the file itself, so at best a large file loads in
+about half the serial time.  With few CPUs it is slower than a serial
+load; lazy=True or arrays='array' are usually the better ways to load
+large files quickly.
+@type workers: int
+@param chunksize: bytes decompressed at a time from a compressed file,
+default L{compressed.CHUNK_SIZE}
+@type chunksize: int
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
+        wanted = _typeFilter(include, exclude)
         if filename:
             self.filename = filename
 
         if self.filename:
-            fh = open(self.filename, 'rb')
-            self._load(fh)
-
-    def _load(self, fh):
+            self.index = None
+            if isCompressed(self.filename):
+                fh = openRead(self.filename, chunksize)
+                try:
+                    if mmap or lazy:
+                        self._load(memoryview(fh.read()), lazy, arrays,
+                                   wanted, placeholders)
+                    else:
+                        self._load(fh, False, arrays, wanted, placeholders)
+                finally:
+                    fh.close()
+            elif workers is not None and workers > 1 and not lazy:
+                self._loadParallel(workers, arrays, include, exclude,
+                                   placeholders)
+            elif mmap or lazy:
+                self._load(mapFile(self.filename), lazy, arrays, wanted,
+                           placeholders)
+            else:
+                fh = open(self.filename, 'rb')
+                self._load(fh, False, arrays, wanted, placeholders)
+
+    def _loadParallel(self, workers, arrays=None, include=None,
+                      exclude=None, placeholders=False):
+        """Decode self.filename in worker processes, see L{load}."""
+        index = RecordIndex.build(self.filename, wmf=False)
+        if len(index) == 0:
+            self._load(open(self.filename, 'rb'), False, arrays,
+                       _typeFilter(include, exclude), placeholders)
+            return
+        if arrays is True:
+            arrays = 'array'
+        # the handles of the cached objects are being replaced
+        self._objectcache = ObjectCache()
+        jobs = [(self.filename, start, end, arrays, include, exclude,
+                 placeholders)
+                for (start, end) in _chunkBounds(index, workers * 4)]
+
+        from concurrent.futures import ProcessPoolExecutor
         self.records = []
-        self._unserialize(fh)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for chunk in executor.map(_decodeChunk, jobs):
+                self.records.extend(chunk)
+        finally:
+            executor.shutdown()
+
+        # the handle table has to be replayed in file order
+        for e in self.records:
+            _trackHandles(self.dc, e)
+            if self.verbose:
+                print("Unserializing: ", end=' ')
+                print(e)
         self.scaleheader = False
-        # get DC from header record
         self.dc.getBounds(self.records[0])
 
-    def _unserialize(self, fh):
-        try:
-            count = 1
-            while count > 0:
-                data = fh.read(8)
-                count = len(data)
-                if count > 0:
-                    (iType, nSize) = struct.unpack("<ii", data)
-                    if self.verbose:
-                        print("EMF:  iType=%d nSize=%d" % (iType, nSize))
-
-                    if iType in emr._emrmap:
-                        e = emr._emrmap[iType]()
-                    else:
-                        print('Unknown iType', repr(iType))
-                        e = _EMR_UNKNOWN()
+    def loadIndex(self, filename=None, index=None, arrays=None):
+        """
+Open an existing EMF file for random access.  Rather than reading the
+records, only their positions are looked up in a L{RecordIndex}, and
+each record is then decoded from the memory-mapped file by L{record}
+when it is asked for.  The record list is left empty, so the file
+can't be saved until it is loaded normally.
+
+@param filename: filename to open
+@type filename: string
+@param index: a L{RecordIndex}, or the name of an index file written
+by L{RecordIndex.save}.  If None, the sidecar index next to the file
+is used when it is up to date; otherwise the file is indexed by
+scanning the record headers.  The index is available as self.index
+and can be saved for later sessions.
+@type index: L{RecordIndex} or string
+@param arrays: how point lists are decoded, see L{load}.
+@type arrays: string
+        """
+        if filename:
+            self.filename = filename
+
+        if arrays is True:
+            arrays = 'array'
+        self.records = []
+        self._objectcache = ObjectCache()
+        self.index = RecordIndex.open(self.filename, False, index)
+        self._view = mapFile(self.filename)
+        self._arraytype = arrays
+        self.scaleheader = False
+        self.dc.getBounds(self.record(0))
+
+    def record(self, i):
+        """
+Return record number i.  After L{loadIndex} the record is decoded from
+the file each time it is requested, without touching any other record;
+otherwise it is simply self.records[i].
+
+@param i: record number; negative numbers count from the end
+@type i: int
+@return: the record
+        """
+        if self.index is None:
+            return self.records[i]
+        return self.index.decode(self._view, i, self._arraytype)
+
+    def patch(self, i, e=None):
+        """
+Rewrite record number i in the file it was loaded from, without
+touching any other part of the file.  The record must pack to exactly
+its original size, e.g. a pen or brush with a new color, or text
+replaced by text of the same length.  Record offsets come from
+self.index after L{loadIndex}; after L{load} the file's record headers
+are scanned once to find them.
+
+@param i: record number; negative numbers count from the end
+@type i: int
+@param e: the replacement record.  After L{load} it defaults to the
+(modified) self.records[i], and otherwise also replaces it.  After
+L{loadIndex} it must be given.
+@raise ValueError: if the record size would change, or no record is
+given after L{loadIndex}
+        """
+        if self.index is None:
+            self._patchindex = RecordIndex.patchLoaded(
+                self.filename, self.records, i, e, False, self._patchindex)
+            # the new record may have different bounds
+            self._changed()
+        elif e is None:
+            raise ValueError("patch() needs the replacement record after "
+                             "loadIndex(), e.g. a changed copy of record(%d)" % i)
+        else:
+            self.index.patch(i, e, self.filename)
 
-                    e.unserialize(fh, data, iType, nSize)
-                    self.records.append(e)
+    def _load(self, fh, lazy=False, arrays=None, wanted=None,
+              placeholders=False):
+        self.records = []
+        # the handles of the cached objects are being replaced
+        self._objectcache = ObjectCache()
+        if arrays is True:
+            arrays = 'array'
+        self._unserialize(fh, lazy, arrays, wanted, placeholders)
+        self.scaleheader = False
+        # get DC from header record
+        self.dc.getBounds(self.records[0])
 
-                    if e.hasHandle():
-                        self.dc.addObject(e, e.handle)
-                    elif isinstance(e, emr._DELETEOBJECT):
-                        self.dc.removeObject(e.handle)
+    def _unserialize(self, fh, lazy=False, arraytype=None, wanted=None,
+                     placeholders=False):
+        if isinstance(fh, memoryview):
+            reader = _readRecordsBuffer(fh, self.verbose, lazy, arraytype,
+                                        wanted, placeholders)
+        else:
+            reader = _readRecords(fh, self.verbose, arraytype, wanted,
+                                  placeholders)
 
-                    if self.verbose:
-                        print("Unserializing: ", end=' ')
-                        print(e)
+        for e in reader:
+            self.records.append(e)
+            _trackHandles(self.dc, e)
 
-        except EOFError:
-            pass
+            if self.verbose:
+                print("Unserializing: ", end=' ')
+                print(e)
 
     def _append(self, e):
         """Append an EMR to the record list, unless the record has
-        been flagged as having an error."""
+        been flagged as having an error.  Its bounds are merged into
+        the running path bounds while a path is open.  When streaming,
+        the record is written out instead and only its bounds are kept."""
         if not e.error:
             if self.verbose:
                 print("Appending: ", end=' ')
                 print(e)
+            if self._stream is not None:
+                self._emit(e)
+                if self._pathopen:
+                    self._trackPathBounds(e)
+                if self.fitheader or self._appending:
+                    self._trackDrawBounds(e)
+                return 1
+            if self.records is not self._tracked:
+                self._changed()
             self.records.append(e)
+            # records added some other way are picked up by the rescan
+            # in _getPathBounds instead
+            if self._pathopen and self._pathend == len(self.records) - 1:
+                self._trackPathBounds(e)
+                self._pathend += 1
             return 1
         return 0
 
-    def _end(self):
+    def stream(self, filename, coalesce=False, redundant=False):
         """
-Append an EOF record and compute header information.  The header needs
-to know the number of records, number of handles, bounds, and size of
-the entire metafile before it can be written out, so we have to march
-through all the records and gather info.
+Switch to streaming mode: from now on every record is written to the
+file as soon as it is created rather than kept in memory, so memory
+use doesn't grow with the size of the drawing.  The running size and
+record count are tracked as records are written, and L{close} appends
+the EOF record and goes back to fill in the header.  Records created
+before this call are written out immediately.
+
+Streamed records are not kept, so self.records stays empty.
+
+@param filename: filename to write.  Can't be a compressed (.emz)
+file, since the header is only filled in at the end.
+@type filename: string
+@param coalesce: if True, runs of polylines or polygons are held back
+and written as single polypolyline or polypolygon records, as by
+L{optimize}
+@type coalesce: Boolean
+@param redundant: if True, records that don't change the drawing
+state are left out, as by L{optimize}
+@type redundant: Boolean
+        """
+        if wantsCompression(filename):
+            raise ValueError("can't stream to a compressed file; use save()")
+        self.filename = filename
+        # bring the running bounds up to date while the records are here
+        self._getPathBounds()
+        self.getDrawingBounds()
+        self._stream = open(filename, 'wb')
+        self._header = self.records[0]
+        # the header is written now to reserve its space; its size
+        # doesn't change when it is filled in at the end
+        self._header.nBytes = self._header.resize()
+        self._header.serialize(self._stream)
+        self._nrecords = 1
+        self._stages = []
+        if redundant:
+            self._stages.append(StateFilter())
+        if coalesce:
+            self._stages.append(Coalescer())
+        pending = self.records[1:]
+        self.records = []
+        for e in pending:
+            self._emit(e)
+
+    def append(self, filename):
         """
+Open an existing EMF file to add records to the end of it in place.
+Only the header and the final EOF record are read.  New records are
+written over the EOF record as they are created, as in L{stream}
+mode, and L{close} writes a new EOF record and updates the size,
+record count, handle count and bounds in the header.  The bounds and
+frame are widened to take in anything drawn outside them.  The time taken
+depends only on the number of records added.
+
+New graphics objects get handles above all those counted in the
+header, so they can't clash with objects still selected in the file.
+
+@param filename: filename to append to; can't be compressed
+@type filename: string
+        """
+        if isCompressed(filename):
+            raise ValueError("can't append to a compressed file in place")
+        fh = open(filename, 'r+b')
+        try:
+            header = probe(fh).header
+            eof = self._findEOF(fh)
+        except:
+            fh.close()
+            raise
+
+        self.filename = filename
+        self.index = None
+        self.records = []
+        self.scaleheader = False
+        self.dc.getBounds(header)
+        self.dc.setPhysicalSize(header.rclFrame)
+        self.dc.objects = [None] * max(header.nHandles, 1)
+        self.dc.objectholes = []
+        self._objectcache = ObjectCache()
+        self.pathstart = 0
+        self._pathbounds = None
+        self._pathopen = False
+        # what is already in the file is only known from its header
+        self._drawbounds = [list(header.rclBounds[0]),
+                            list(header.rclBounds[1])]
+        self._textstate = _TextState()
+        self._appending = True
+        self._header = header
+        header.nBytes = eof
+        # the old EOF is counted again when the new one is written
+        self._nrecords = header.nRecords - 1
+        fh.seek(eof)
+        self._stream = fh
+
+    def _findEOF(self, fh):
+        """Return the offset of the EOF record at the end of an open
+        EMF.  The EOF record normally ends with its own size, but short
+        12 byte EOF records exist too."""
+        fh.seek(0, 2)
+        end = fh.tell()
+        fh.seek(end - 4)
+        (last,) = struct.unpack("<i", fh.read(4))
+        for size in (last, 20, 12):
+            if size < 8 or size > end:
+                continue
+            fh.seek(end - size)
+            (iType, nSize) = struct.unpack("<ii", fh.read(8))
+            if iType == emr._EOF.emr_id and nSize == size:
+                return end - size
+        raise ValueError("%s doesn't end with an EOF record" %
+                         getattr(fh, 'name', 'file'))
+
+    def _trackPathBounds(self, e):
+        """Merge the bounds of a new record into the running bounds of
+        the current path, so that L{_getPathBounds} doesn't have to go
+        back over the records of the path."""
+        objbounds = e.getBounds()
+        if not objbounds:
+            return
+        if self._pathbounds is None:
+            self._pathbounds = [[objbounds[0][0], objbounds[0][1]],
+                                [objbounds[1][0], objbounds[1][1]]]
+        else:
+            self._mergeBounds(self._pathbounds, objbounds)
+
+    def _trackDrawBounds(self, e):
+        """Merge the bounds of a new record into the running bounds of
+        the whole drawing, see L{spatial.recordBounds}."""
+        objbounds = recordBounds(e, self._pageBounds(), self._textstate)
+        if objbounds is None:
+            return
+        if self._drawbounds is None:
+            self._drawbounds = [[objbounds[0][0], objbounds[0][1]],
+                                [objbounds[1][0], objbounds[1][1]]]
+        else:
+            self._mergeBounds(self._drawbounds, objbounds)
+
+    def getDrawingBounds(self):
+        """
+Return the smallest rectangle holding everything drawn so far, as
+((left, top), (right, bottom)) in logical units, or None if nothing
+with bounds has been drawn.  The rectangle is the union of the bounds
+of the records, see L{spatial.recordBounds}.  It is worked out when
+asked for, and later calls only look at the records added since.  When
+self.fitheader is True it is written to the header in place of the
+page size.
+
+Streamed records aren't kept, so while L{stream}ing their bounds are
+only collected if self.fitheader was set before L{stream} was called.
+
+Logical units are the header's device units unless the mapping mode,
+window/viewport extents or world transform are changed.
+
+@rtype: tuple
+        """
+        if self.records is not self._tracked:
+            self._changed()
+        if self._stream is None and self._drawend != len(self.records):
+            if not 0 <= self._drawend < len(self.records):
+                self._drawbounds = None
+                self._drawend = 0
+                self._textstate = _TextState()
+            for e in self.records[self._drawend:]:
+                self._trackDrawBounds(e)
+            self._drawend = len(self.records)
+        if self._drawbounds is None:
+            return None
+        return (tuple(self._drawbounds[0]), tuple(self._drawbounds[1]))
+
+    def recordsInRect(self, rect, unbounded=False):
+        """
+Return the records whose bounds intersect a rectangle, in drawing
+order.  The first call builds a L{SpatialIndex} over the records,
+which is reused until records are added or removed, so repeated
+queries (e.g. one per map tile) only look at the records near the
+rectangle.  Records changed in place aren't noticed; set
+self.records to a new list to force the index to be rebuilt.
+
+@param rect: ((left, top), (right, bottom)) in logical units
+@param unbounded: also return the records that have no bounds, like
+the creation and selection of pens and brushes, so the result can be
+played back on its own
+@type unbounded: Boolean
+@rtype: list
+        """
+        if self.records is not self._tracked:
+            self._changed()
+        index = self._spatial
+        if index is None or self._spatialend != len(self.records):
+            index = self._spatial = SpatialIndex(self.records,
+                                                 page=self._pageBounds())
+            self._spatialend = len(self.records)
+        return index.recordsInRect(rect, unbounded)
+
+    def simplify(self, tolerance):
+        """
+Simplify the polylines and polygons already in the metafile, e.g.
+after L{load}, with the Douglas-Peucker algorithm.  Points closer than
+tolerance to the simplified line are removed.  Use a tolerance of
+about half a pixel to shrink dense data without any visible change.
+To simplify the lines as they are drawn instead, set
+self.simplifytolerance.
+
+@param tolerance: distance in logical units
+@type tolerance: float
+@return: the number of points removed
+@rtype: int
+        """
+        return simplifyRecords(self.records, tolerance)
+
+    def optimize(self, merge=True, redundant=True):
+        """
+Rewrite the records into fewer records that draw the same picture.
+The same passes can be applied while streaming with the options of
+L{stream}, or to any record iterator with L{optimize.dropRedundant}
+and L{optimize.coalesce}.
+
+@param merge: merge runs of consecutive polylines (or polygons) with
+nothing in between into one polypolyline (or polypolygon) record, 16
+bit if the points allow; see L{optimize.Coalescer} for when polygons
+are kept apart.
+@type merge: Boolean
+@param redundant: drop records that don't change the drawing state,
+such as selecting the pen that is already selected or an empty
+SaveDC/RestoreDC pair; see L{optimize.StateFilter}.  This is done
+first, so the lines on either side of a dropped record can be merged.
+@type redundant: Boolean
+@return: the number of records removed
+@rtype: int
+        """
+        before = len(self.records)
+        records = self.records
+        if redundant:
+            records = dropRedundant(records)
+        if merge:
+            records = coalesce(records)
+        self.records = list(records)
+        self._changed()
+        return before - len(self.records)
+
+    def _changed(self):
+        """Note that self.records was replaced or changed other than by
+        appending, so the running path and drawing bounds and the
+        spatial index are rebuilt from it when they are next needed.
+        Comparing the list's length alone can't tell, since it may
+        grow back to the length it had."""
+        self._tracked = self.records
+        self._pathend = -1
+        self._drawend = -1
+        self._spatial = None
+
+    def _pageBounds(self):
+        """Return the bounds of the whole page in logical units."""
+        dc = self.dc
+        return ((dc.bounds_left, dc.bounds_top),
+                (dc.bounds_right, dc.bounds_bottom))
+
+    def _headerBounds(self, header):
+        """Fill in the bounds of the header, fitted to the drawing if
+        self.fitheader is set.  When appending, the bounds read from the
+        file are widened to take in the new records."""
+        drawn = None
+        if self.fitheader:
+            drawn = self.getDrawingBounds()
+        elif self._appending:
+            drawn = self.getDrawingBounds()
+            if drawn == self._pageBounds():
+                # nothing drawn outside, so keep the frame exactly
+                drawn = None
+        header.setBounds(self.dc, self.scaleheader, drawn)
+
+    def _emit(self, e):
+        """Write a streamed record, through the optimizer stages if
+        there are any."""
+        records = [e]
+        for stage in self._stages:
+            passed = []
+            for r in records:
+                passed.extend(stage.push(r))
+            records = passed
+        for r in records:
+            self._write(r)
+
+    def _write(self, e):
+        """Serialize one record to the stream and count it in the
+        header totals."""
+        e.serialize(self._stream)
+        self._nrecords += 1
+        self._header.nBytes += e.nSize
+
+    def close(self):
+        """
+Finish a file started by L{stream}: write the EOF record, update the
+header with the final size, record count, handle count and bounds, and
+close the file.
+
+@returns: True for success, False if the EMF wasn't streaming.
+@rtype: Boolean
+        """
+        if self._stream is None:
+            return False
+        self._pathbounds = None
+        self._pathopen = False
+        self._emit(emr._EOF())
+        self._stages = []
+        header = self._header
+        self._headerBounds(header)
+        header.nRecords = self._nrecords
+        header.nHandles = len(self.dc.objects)
+        fh = self._stream
+        try:
+            if self._appending:
+                # the existing header may not pack back to the same
+                # size, so only the changed fields are rewritten
+                fh.truncate()
+                fh.seek(8)
+                fh.write(struct_pack("<8i", *(header.rclBounds[0] + header.rclBounds[1] +
+                                              header.rclFrame[0] + header.rclFrame[1])))
+                fh.seek(48)
+                fh.write(struct_pack("<iih", header.nBytes, header.nRecords,
+                                     header.nHandles))
+            else:
+                fh.seek(0)
+                header.serialize(fh)
+        finally:
+            fh.close()
+            self._stream = None
+            self._appending = False
+        self.records = [header]
+        return True
+
+    def _end(self):
+        """
+Append an EOF record, compute header information and serialize the
+records.  The header needs to know the number of records, number of
+handles, bounds, and size of the entire metafile before it can be
+written out, so we march through all the records and size them first.
+The exact total is then used to preallocate a single buffer that every
+record is packed into exactly once.  Returns the bytes of that buffer,
+which BytesIO hands over without copying them again.
+        """
+        size = self._prepare()
+        fh = BytesIO()
+        if size:
+            # writing at the end grows the empty buffer to its full size
+            fh.seek(size - 1)
+            fh.write(b'\0')
+        buf = fh.getbuffer()
+        ptr = 0
+        for e in self.records:
+            if self.verbose:
+                print(e)
+            ptr = e.serializeInto(buf, ptr)
+        buf.release()
+        return fh.getvalue()
+
+    def _endChunked(self, fh, chunksize=None):
+        """
+Like L{_end}, but write the records to fh through a reusable buffer
+of chunksize bytes instead of building the whole file in memory.
+Used for compressed output, where the compressor consumes the data in
+pieces anyway.
+        """
+        self._prepare()
+        chunksize = chunksize or CHUNK_SIZE
+        buf = bytearray(chunksize)
+        view = memoryview(buf)
+        ptr = 0
+        for e in self.records:
+            if self.verbose:
+                print(e)
+            if ptr + e.nSize > chunksize:
+                fh.write(view[:ptr])
+                ptr = 0
+                if e.nSize > chunksize:
+                    big = bytearray(e.nSize)
+                    e.serializeInto(big, 0)
+                    fh.write(big)
+                    continue
+            ptr = e.serializeInto(buf, ptr)
+        fh.write(view[:ptr])
+
+    def _prepare(self):
+        """Add the EOF record if needed, fill in the header and size
+        every record.  Returns the total size of the metafile."""
 
         end = self.records[-1]
         if not isinstance(end, emr._EOF):
@@ -196,70 +1083,84 @@ through all the records and gather info.
             e = emr._EOF()
             self._append(e)
         header = self.records[0]
-        header.setBounds(self.dc, self.scaleheader)
+        self._headerBounds(header)
         header.nRecords = len(self.records)
         header.nHandles = len(self.dc.objects)
         size = 0
         for e in self.records:
-            e.resize()
-            size += e.nSize
+            size += e.resize()
             if self.verbose:
                 print("size=%d total=%d" % (e.nSize, size))
         if self.verbose:
             print("total: %s bytes" % size)
         header.nBytes = size
+        return size
 
-    def save(self, filename=None):
+    def save(self, filename=None, compresslevel=None):
         """
-Write the EMF to disk.
+Write the EMF to disk.  When L{stream}ing, this is the same as
+L{close}.
 
-@param filename: filename to write
-@type filename: string
+@param filename: filename to write, or a file-like object opened in
+binary mode.  Names ending in .emz are written gzip compressed.
+@type filename: string or file
+@param compresslevel: if given, compress the file with this gzip
+level (0-9) whatever its name, including a file-like object.  Compressed files are written in
+chunks rather than from one buffer holding the whole metafile.
+@type compresslevel: int
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
 
-        self._end()
-
-        if filename:
-            self.filename = filename
+        if self._stream is not None:
+            return self.close()
 
-        if self.filename:
-            try:
-                fh = open(self.filename, "wb")
-                self._serialize(fh)
-                fh.close()
-                return True
-            except:
-                raise
+        if hasattr(filename, 'write'):
+            target = filename
+        else:
+            if filename:
+                self.filename = filename
+            if not self.filename:
                 return False
-        return False
+            target = self.filename
 
-    def _serialize(self, fh):
-        for e in self.records:
-            if self.verbose:
-                print(e)
-            e.serialize(fh)
+        try:
+            if hasattr(target, 'write') and compresslevel is None:
+                target.write(self._end())
+            elif hasattr(target, 'write') or \
+                    wantsCompression(target, compresslevel):
+                fh = openWrite(target, compresslevel)
+                try:
+                    self._endChunked(fh)
+                finally:
+                    fh.close()
+            else:
+                output = self._end()
+                fh = open(target, "wb")
+                try:
+                    fh.write(output)
+                finally:
+                    fh.close()
+        except IOError:
+            return False
+        return True
+
+    def tobytes(self):
+        """
+Return the complete EMF as a string of bytes, as it would be written
+by L{save}.
+
+@rtype: bytes
+        """
+        return self._end()
 
     def _create(self, width, height, dots_per_unit, units):
         pass
 
     def _getBounds(self, points):
-        """Get the bounding rectangle for this list of 2-tuples."""
-        left = points[0][0]
-        right = left
-        top = points[0][1]
-        bottom = top
-        for x, y in points[1:]:
-            if x < left:
-                left = x
-            elif x > right:
-                right = x
-            if y < top:
-                top = y
-            elif y > bottom:
-                bottom = y
-        return ((left, top), (right, bottom))
+        """Get the bounding rectangle for this list of 2-tuples, or
+        for an (N,2) numpy array."""
+        return _pointBounds(points)
 
     def _mergeBounds(self, bounds, itembounds):
         if itembounds:
@@ -274,47 +1175,32 @@ Write the EMF to disk.
 
     def _getPathBounds(self):
         """Get the bounding rectangle for the list of EMR records
-        starting from the last saved path start to the current record."""
+        starting from the last saved path start to the current record.
+        Between L{BeginPath} and the call that uses the path the bounds
+        are kept up to date by L{_append}, so this is just a copy; the
+        records are only scanned otherwise, or if the list was changed
+        some other way, e.g. by loading a file."""
+        if self.records is not self._tracked:
+            self._changed()
+        if self._stream is None and self._pathend != len(self.records):
+            self._pathbounds = None
+            for e in self.records[self.pathstart:]:
+                self._trackPathBounds(e)
+            self._pathend = len(self.records)
+
         # If there are no bounds supplied, default to the EMF standard
         # of ((0,0),(-1,-1)) which means that the bounds aren't
         # precomputed.
-        bounds = [[0, 0], [-1, -1]]
-
-        # find the first bounds
-        for i in range(self.pathstart, len(self.records)):
-            # print "FIXME: checking initial bounds on record %d" % i
-            e = self.records[i]
-            # print e
-            # print "bounds=%s" % str(e.getBounds())
-            objbounds = e.getBounds()
-            if objbounds:
-                # print "bounds=%s" % str(objbounds)
-                # have to copy the object manually because we don't
-                # want to overwrite the object's bounds
-                bounds = [[objbounds[0][0], objbounds[0][1]],
-                          [objbounds[1][0], objbounds[1][1]]]
-                break
-
-        # if there are more records with bounds, merge them
-        for j in range(i, len(self.records)):
-            # print "FIXME: checking bounds for more records: %d" % j
-            e = self.records[j]
-            # print e
-            # print "bounds=%s" % str(e.getBounds())
-            self._mergeBounds(bounds, e.getBounds())
-
-        return bounds
+        if self._pathbounds is None:
+            return [[0, 0], [-1, -1]]
+        # a copy, so the caller's record doesn't share the running bounds
+        return [list(self._pathbounds[0]), list(self._pathbounds[1])]
 
     def _useShort(self, bounds):
         """Determine if we can use the shorter 16-bit EMR structures.
         If all the numbers can fit within 16 bit integers, return
         true.  The bounds 4-tuple is (left,top,right,bottom)."""
-
-        SHRT_MIN = -32768
-        SHRT_MAX = 32767
-        if bounds[0][0] >= SHRT_MIN and bounds[0][1] >= SHRT_MIN and bounds[1][0] <= SHRT_MAX and bounds[1][1] <= SHRT_MAX:
-            return True
-        return False
+        return _useShort(bounds)
 
     def _appendOptimize16(self, points, cls16, cls):
         bounds = self._getBounds(points)
@@ -326,18 +1212,38 @@ Write the EMF to disk.
             return 0
         return 1
 
-    def _appendOptimizePoly16(self, polylist, cls16, cls):
+    def _appendOptimizePoly16(self, polylist, cls16, cls, counts=None):
         """polylist is a list of lists of points, where each inner
         list represents a single polygon or line.  The number of
-        polygons is the size of the outer list."""
-        points = []
-        polycounts = []
-        for polygon in polylist:
-            count = 0
-            for point in polygon:
-                points.append(point)
-                count += 1
-            polycounts.append(count)
+        polygons is the size of the outer list.  If counts is given,
+        polylist is instead the points of all the polygons one after
+        the other, and counts the number of points in each polygon."""
+        if counts is not None:
+            points = polylist
+            if _isNumpy(counts):
+                polycounts = counts.astype('i')
+            else:
+                polycounts = list(counts)
+            if sum(polycounts) != len(points):
+                raise ValueError("polygon counts don't add up to the number of points")
+        elif polylist and all(_isNumpy(polygon) for polygon in polylist):
+            # join the arrays without going through Python objects
+            points = numpy.concatenate(polylist)
+            polycounts = [len(polygon) for polygon in polylist]
+        else:
+            points = []
+            polycounts = []
+            for polygon in polylist:
+                count = 0
+                for point in polygon:
+                    points.append(point)
+                    count += 1
+                polycounts.append(count)
+
+        if self.simplifytolerance:
+            (points, polycounts) = simplifyParts(
+                points, polycounts, self.simplifytolerance,
+                cls is emr._POLYPOLYGON)
 
         bounds = self._getBounds(points)
         if self._useShort(bounds):
@@ -350,10 +1256,30 @@ Write the EMF to disk.
 
     def _appendHandle(self, e):
         handle = self.dc.addObject(e)
+        # set before appending, as a streamed record is written at once
+        e.handle = handle
         if not self._append(e):
             self.dc.popObject()
             return 0
-        e.handle = handle
+        return handle
+
+    def _appendCached(self, key, e):
+        """Append the object creation record e, unless self.objectbudget
+        is set and an object created with the same key is still live, in
+        which case its handle is returned.  When the budget is exceeded,
+        the least recently used objects that aren't selected are
+        deleted first, so their handles can be reused."""
+        if not self.objectbudget:
+            return self._appendHandle(e)
+        cache = self._objectcache
+        handle = cache.lookup(key)
+        if handle is not None:
+            return handle
+        for old in cache.evict(self.objectbudget, self.dc.selectedHandles()):
+            self._deleteObject(old)
+        handle = self._appendHandle(e)
+        if handle:
+            cache.add(key, handle)
         return handle
 
     def GetStockObject(self, obj):
@@ -406,6 +1332,7 @@ Make the given graphics object current.
 @type handle: int
 
         """
+        self.dc.selectObject(handle)
         return self._append(emr._SELECTOBJECT(self.dc, handle))
 
     def DeleteObject(self, handle):
@@ -415,6 +1342,17 @@ Delete the given graphics object. Note that, now, only those contexts
 into which the object has been selected get a delete object
 records.
 
+If self.objectbudget is set, objects returned by the Create functions
+are shared and owned by the cache: deleting one writes nothing, and it
+stays available for reuse until it is evicted.
+
+B{Note:} When a new object would take the cache over the budget, the
+least recently created or reused object that isn't selected (now or
+in a state saved by L{SaveDC}) is deleted and its handle is given to
+the new object.  A handle kept from an earlier Create call then refers
+to a different object, so with a budget, call the Create function
+again each time an object is needed rather than keeping its handle.
+
 @param    handle:  	handle of graphics object to delete.
 
 @return:    true if the object was successfully deleted.
@@ -422,8 +1360,16 @@ records.
 @type handle: int
 
         """
+        if handle in self._objectcache:
+            if self.objectbudget:
+                return 1
+            self._objectcache.remove(handle)
+        return self._deleteObject(handle)
+
+    def _deleteObject(self, handle):
         e = emr._DELETEOBJECT(self.dc, handle)
         self.dc.removeObject(handle)
+        self.dc.forgetObject(handle)
         return self._append(e)
 
     def CreatePen(self, style, width, color):
@@ -444,27 +1390,33 @@ Create a pen, used to draw lines and path outlines.
 @param    width:  	the width of the new pen.
 @param    color:  	(r,g,b) tuple or the packed integer L{color<RGB>} of the new pen.
 
-@return:    handle to the new pen graphics object.
+@return:    handle to the new pen graphics object, or a shared one if
+self.objectbudget is set; see L{DeleteObject}.
 @rtype: int
 @type style: int
 @type width: int
 @type color: int
 
         """
-        return self._appendHandle(emr._CREATEPEN(style, width, _normalizeColor(color)))
+        color = _normalizeColor(color)
+        return self._appendCached(('pen', style, width, color),
+                                  emr._CREATEPEN(style, width, color))
 
     def CreateSolidBrush(self, color):
         """
 
 Create a solid brush used to fill polygons.
 @param color: the L{color<RGB>} of the solid brush.
-@return: handle to brush graphics object.
+@return: handle to brush graphics object, or a shared one if
+self.objectbudget is set; see L{DeleteObject}.
 
 @rtype: int
 @type color: int
 
         """
-        return self._appendHandle(emr._CREATEBRUSHINDIRECT(color=_normalizeColor(color)))
+        color = _normalizeColor(color)
+        return self._appendCached(('brush', None, color),
+                                  emr._CREATEBRUSHINDIRECT(color=color))
 
     def CreateHatchBrush(self, hatch, color):
         """
@@ -482,13 +1434,17 @@ B{Note:} Currently appears unsupported in OpenOffice.
  - HS_DIAGCROSS
 @type hatch: int
 @param color: the L{color<RGB>} of the 'on' pixels of the brush.
-@return: handle to brush graphics object.
+@return: handle to brush graphics object, or a shared one if
+self.objectbudget is set; see L{DeleteObject}.
 
 @rtype: int
 @type color: int
 
         """
-        return self._appendHandle(emr._CREATEBRUSHINDIRECT(hatch=hatch, color=_normalizeColor(color)))
+        color = _normalizeColor(color)
+        return self._appendCached(('brush', hatch, color),
+                                  emr._CREATEBRUSHINDIRECT(hatch=hatch,
+                                                           color=color))
 
     def SetBkColor(self, color):
         """
@@ -866,15 +1822,17 @@ Set the pixel to the given color.
         """
 
 Draw a sequence of connected lines.
-@param points: list of x,y tuples
+@param points: list of x,y tuples, or an (N,2) numpy array
 @return: true if polyline is successfully rendered.
 @rtype: int
 @type points: tuple
 
         """
+        if self.simplifytolerance:
+            points = simplify(points, self.simplifytolerance)
         return self._appendOptimize16(points, emr._POLYLINE16, emr._POLYLINE)
 
-    def PolyPolyline(self, polylines):
+    def PolyPolyline(self, polylines, counts=None):
         """
 
 Draw multiple polylines.  The polylines argument is a list of lists,
@@ -888,13 +1846,23 @@ described by a list of x,y tuples as in L{Polyline}.  For example::
 draws two lines, one from 100,100 to 200,100, and another from 300,100
 to 400,100.
 
+The lines may also be (N,2) numpy arrays, or all the points may be
+given in a single array with the number of points in each line in
+counts::
+
+  emf.PolyPolyline(numpy.array([(100,100),(200,100),(300,100),(400,100)]),
+                   [2, 2])
+
 @param polylines: list of lines, where each line is a list of x,y tuples
 @type polylines: list
+@param counts: number of points in each line, if polylines holds the
+points of all the lines
+@type counts: list
 @return: true if polypolyline is successfully rendered.
 @rtype: int
 
         """
-        return self._appendOptimizePoly16(polylines, emr._POLYPOLYLINE16, emr._POLYPOLYLINE)
+        return self._appendOptimizePoly16(polylines, emr._POLYPOLYLINE16, emr._POLYPOLYLINE, counts)
 
     def Polygon(self, points):
         """
@@ -907,12 +1875,14 @@ the border is drawn with the current pen, and the interior is filled
 with the current brush.  See L{SetPolyFillMode} for the fill effects
 when an overlapping polygon is defined.
 
-@param points: list of x,y tuples
+@param points: list of x,y tuples, or an (N,2) numpy array
 @return: true if polygon is successfully rendered.
 @rtype: int
 @type points: tuple
 
         """
+        if self.simplifytolerance:
+            points = simplify(points, self.simplifytolerance, True)
         if len(points) == 4:
             if points[0][0] == points[1][0] and points[2][0] == points[3][0] and points[0][1] == points[3][1] and points[1][1] == points[2][1]:
                 if self.verbose:
@@ -924,7 +1894,7 @@ when an overlapping polygon is defined.
                 return self.Rectangle(points[0][0], points[0][1], points[2][0], points[2][1])
         return self._appendOptimize16(points, emr._POLYGON16, emr._POLYGON)
 
-    def PolyPolygon(self, polygons):
+    def PolyPolygon(self, polygons, counts=None):
         """
 
 Draw multiple polygons.  The polygons argument is a list of lists,
@@ -941,13 +1911,19 @@ B{Note:} Currently partially supported in OpenOffice.  The line width
 is ignored and the polygon border is not closed (the final point is
 not connected to the starting point in each polygon).
 
+As with L{PolyPolyline}, the polygons may be numpy arrays, or a single
+array of points split up by counts.
+
 @param polygons: list of polygons, where each polygon is a list of x,y tuples
 @type polygons: list
+@param counts: number of points in each polygon, if polygons holds
+the points of all the polygons
+@type counts: list
 @return: true if polypolygon is successfully rendered.
 @rtype: int
 
         """
-        return self._appendOptimizePoly16(polygons, emr._POLYPOLYGON16, emr._POLYPOLYGON)
+        return self._appendOptimizePoly16(polygons, emr._POLYPOLYGON16, emr._POLYPOLYGON, counts)
 
     def Ellipse(self, left, top, right, bottom):
         """
@@ -1121,7 +2097,8 @@ points each: two control points and an end point, as the ending point
 of the previous curve is used as the starting point for the next
 curve.
 
-@param points: list of x,y tuples that are either end points or control points
+@param points: list of x,y tuples that are either end points or control
+points, or an (N,2) numpy array
 @return: true if bezier curve was successfully rendered.
 @rtype: int
 @type points: tuple
@@ -1137,8 +2114,11 @@ Begin defining a path.  Any previous unclosed paths are discarded.
 @rtype: int
 
         """
+        self._pathbounds = None
         # record next record number as first item in path
         self.pathstart = len(self.records)
+        self._pathend = self.pathstart
+        self._pathopen = True
         return self._append(emr._BEGINPATH())
 
     def EndPath(self):
@@ -1239,7 +2219,8 @@ curve.  If the arc is successfully rendered, the current position is
 updated so that subsequent path operations such as L{LineTo},
 L{PolylineTo}, etc. will follow from the end of the curve.
 
-@param points: list of x,y tuples that are either end points or control points
+@param points: list of x,y tuples that are either end points or control
+points, or an (N,2) numpy array
 @return: true if bezier curve was successfully rendered.
 @rtype: int
 @type points: tuple
@@ -1270,6 +2251,7 @@ selected brush and polygon fill mode.
 
         """
         bounds = self._getPathBounds()
+        self._pathopen = False
         return self._append(emr._FILLPATH(bounds))
 
     def StrokePath(self):
@@ -1283,6 +2265,7 @@ selected pen.
 
         """
         bounds = self._getPathBounds()
+        self._pathopen = False
         return self._append(emr._STROKEPATH(bounds))
 
     def StrokeAndFillPath(self):
@@ -1301,6 +2284,7 @@ B{Note:} Supported in OpenOffice 2.*, unsupported in OpenOffice 1.*.
 
         """
         bounds = self._getPathBounds()
+        self._pathopen = False
         return self._append(emr._STROKEANDFILLPATH(bounds))
 
     def SelectClipPath(self, mode=RGN_COPY):
@@ -1323,6 +2307,7 @@ bounding rectangle of the path as the clip area, not the path itself.
 @rtype: int
 
         """
+        self._pathopen = False
         return self._append(emr._SELECTCLIPPATH(mode))
 
     def SaveDC(self):
@@ -1339,6 +2324,7 @@ bounding rectangle of the path as the clip area, not the path itself.
 @rtype: int
 
         """
+        self.dc.saveState()
         return self._append(emr._SAVEDC())
 
     def RestoreDC(self, stackid):
@@ -1361,6 +2347,7 @@ bounding rectangle of the path as the clip area, not the path itself.
 @rtype: int
 
         """
+        self.dc.restoreState(-1)
         return self._append(emr._RESTOREDC(-1))
 
     def SetTextAlign(self, alignment):
@@ -1495,7 +2482,8 @@ values:
    - FF_SCRIPT
    - FF_DECORATIVE
 @param name: ASCII string containing the name of the font face.
-@return: handle of font.
+@return: handle of font, or a shared one if self.objectbudget is set;
+see L{DeleteObject}.
 @rtype: int
 @type height: int
 @type width: int
@@ -1513,11 +2501,11 @@ values:
 @type name: string
 
         """
-        return self._appendHandle(
-            emr._EXTCREATEFONTINDIRECTW(
-                height, width, escapement, orientation, weight, italic,
-                underline, strike_out, charset, out_precision,
-                clip_precision, quality, pitch_family, name))
+        params = (height, width, escapement, orientation, weight, italic,
+                  underline, strike_out, charset, out_precision,
+                  clip_precision, quality, pitch_family, name)
+        return self._appendCached(('font',) + params,
+                                  emr._EXTCREATEFONTINDIRECTW(*params))
 
     def TextOut(self, x, y, text):
         """
@@ -20,6 +20,8 @@
 
 from __future__ import print_function, division
 
+import math
+
 from .record import _EMR_UNKNOWN
 from .field import *
 from .constants import *
@@ -76,11 +78,27 @@ class _HEADER(_EMR_UNKNOWN):
             self.description = u'pyemf' + u'\0' + description + u'\0\0'
         self.nDescription = len(self.description)
 
-    def setBounds(self, dc, scaleheader):
+    def setBounds(self, dc, scaleheader, drawn=None):
+        """Fill in the bounds, frame and device sizes from the DC.  If
+        drawn is given, the bounds are set to it instead of the page
+        size and the frame is shrunk to match, by mapping the drawn
+        rectangle from the page's pixel extent onto its frame."""
         self.rclBounds = [[dc.bounds_left, dc.bounds_top],
                           [dc.bounds_right, dc.bounds_bottom]]
         self.rclFrame = [[dc.frame_left, dc.frame_top],
                          [dc.frame_right, dc.frame_bottom]]
+        if drawn is not None:
+            # round outwards, so fractional coordinates aren't cut off
+            self.rclBounds = [
+                [int(math.floor(drawn[0][0])), int(math.floor(drawn[0][1]))],
+                [int(math.ceil(drawn[1][0])), int(math.ceil(drawn[1][1]))]]
+            sx = (dc.frame_right - dc.frame_left) / max(dc.bounds_right - dc.bounds_left, 1)
+            sy = (dc.frame_bottom - dc.frame_top) / max(dc.bounds_bottom - dc.bounds_top, 1)
+            self.rclFrame = [
+                [int(math.floor(dc.frame_left + (drawn[0][0] - dc.bounds_left) * sx)),
+                 int(math.floor(dc.frame_top + (drawn[0][1] - dc.bounds_top) * sy))],
+                [int(math.ceil(dc.frame_left + (drawn[1][0] - dc.bounds_left) * sx)),
+                 int(math.ceil(dc.frame_top + (drawn[1][1] - dc.bounds_top) * sy))]]
 
         #print(self)
         if scaleheader:
@@ -601,7 +619,7 @@ class _ARCTO(_ARC):
         # less of the ellipse than is specified by the bounds.
         # But at least the actual bounds aren't outside these
         # bounds.
-        return self.rclBox
+        return self.values['rclBox']
 
 # define EMR_POLYDRAW	56
 
@@ -22,13 +22,27 @@ from __future__ import print_function, division
 
 from builtins import str
 from builtins import object
+from builtins import range
+import array
 import struct
+import sys
 import warnings
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from .compat import BytesIO, cunicode
 
 def struct_pack(fmt, *args):
     """ handle conversion of float to int (py3.7 test-suite) """
+    try:
+        return struct.pack(fmt, *args)
+    except struct.error:
+        # only scan the format when struct can't take the arguments
+        # as they are, which is usually a float for an integer field
+        pass
     new_args = []
     arg_toks = 'cbB?hHiIlLqQfdspP'
     int_toks = 'bBhHiIlLqQP'
@@ -47,6 +61,156 @@ def struct_pack(fmt, *args):
     assert len(args) == len(new_args)
     return struct.pack(fmt, *new_args)
 
+# array.array typecodes for struct integer codes, keyed by struct code
+_arraycodes = {}
+
+
+def _arraycode(code):
+    """Return the array.array typecode with the same (standard) size
+    and signedness as the struct integer code."""
+    if code not in _arraycodes:
+        size = struct.calcsize('<' + code)
+        for c in ('bhilq' if code.islower() else 'BHILQ'):
+            if array.array(c).itemsize == size:
+                _arraycodes[code] = c
+                break
+        else:
+            raise TypeError("No array typecode for struct code %s" % code)
+    return _arraycodes[code]
+
+
+def _byteorder(fmt):
+    """Return '<' or '>' for the byte order used by a struct format."""
+    if fmt[0] in '<>':
+        return fmt[0]
+    if fmt[0] == '!':
+        return '>'
+    return '<' if sys.byteorder == 'little' else '>'
+
+
+def _isSequence(value):
+    """True for the list-like containers that can hold the values of a
+    L{List} or L{Tuples} field."""
+    return isinstance(value, (list, tuple)) or _isArray(value)
+
+
+def _isArray(value):
+    """True for the array representations handled by L{_packArray}."""
+    if isinstance(value, (PointArray, array.array)):
+        return True
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _unpackArray(fmt, data, ptr, count, arraytype):
+    """Decode count integers of the struct format fmt starting at
+    data[ptr] in one call.  Returns a numpy array if arraytype is
+    'numpy', otherwise an array.array.  Either can be changed in place
+    like a list."""
+    code = fmt[-1]
+    order = _byteorder(fmt)
+    if arraytype == 'numpy':
+        if numpy is None:
+            raise ImportError("numpy is required for numpy point arrays")
+        dtype = numpy.dtype(order + code)
+        values = numpy.frombuffer(data, dtype, count, ptr)
+        if not values.flags.writeable:
+            # a view of bytes or a read-only memory map
+            values = values.copy()
+        return values
+    size = struct.calcsize('<' + code)
+    values = array.array(_arraycode(code))
+    values.frombytes(data[ptr:ptr + count * size])
+    if order != ('<' if sys.byteorder == 'little' else '>'):
+        values.byteswap()
+    return values
+
+
+def _unpackList(fmt, data, ptr, count):
+    """Decode count values of the struct format fmt, which repeats a
+    single code, starting at data[ptr] into a list with one call rather
+    than one per value."""
+    code = fmt[-1]
+    prefix = fmt[0] if fmt[0] in "<>!=@" else ''
+    size = struct.calcsize(prefix + code)
+    if ptr + count * size > len(data):
+        raise struct.error("unpack requires a buffer of %d bytes" %
+                           (count * size))
+    if code not in 'bBhHiIlLqQ':
+        return list(struct.unpack_from('%s%d%s' % (prefix, count, code),
+                                       data, ptr))
+    return _unpackArray(fmt, data, ptr, count, None).tolist()
+
+
+def _packArray(fmt, value):
+    """Pack a numpy array, array.array or L{PointArray} into the bytes
+    of consecutive struct fmt integers with a single tobytes call."""
+    code = fmt[-1]
+    order = _byteorder(fmt)
+    if isinstance(value, PointArray):
+        value = value.data
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        return numpy.ascontiguousarray(value, numpy.dtype(order + code)).tobytes()
+    if not isinstance(value, array.array) or value.typecode != _arraycode(code):
+        value = array.array(_arraycode(code), value)
+    if order != ('<' if sys.byteorder == 'little' else '>'):
+        value = array.array(value.typecode, value)
+        value.byteswap()
+    return value.tobytes()
+
+
+class PointArray(object):
+    """List compatible sequence of points stored in a flat array.array
+    of coordinates.  Indexing and iteration return each point as a list
+    like the default list of lists representation does, but the
+    coordinates take a fraction of the memory and are packed with a
+    single tobytes() call."""
+
+    def __init__(self, data, rank=2):
+        self.data = data
+        self.rank = rank
+
+    def __len__(self):
+        return len(self.data) // self.rank
+
+    def _index(self, i):
+        num = len(self)
+        if i < 0:
+            i += num
+        if i < 0 or i >= num:
+            raise IndexError("point index out of range")
+        return i * self.rank
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = self._index(i)
+        return list(self.data[i:i + self.rank])
+
+    def __setitem__(self, i, point):
+        i = self._index(i)
+        self.data[i:i + self.rank] = array.array(self.data.typecode, point)
+
+    def __iter__(self):
+        data = self.data
+        rank = self.rank
+        for i in range(0, len(data), rank):
+            yield list(data[i:i + rank])
+
+    def __eq__(self, other):
+        if isinstance(other, PointArray):
+            return self.rank == other.rank and self.data == other.data
+        return self.tolist() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def tolist(self):
+        return list(self)
+
+
 def _roundn(num, n):
     """Round to the nearest multiple of n greater than or equal to the
     given number.  EMF records are required to be aligned to n byte
@@ -85,7 +249,7 @@ class Field(object):
         return size
 
     def calcNumBytes(self, obj, name):
-        if isinstance(obj.values[name], list) or isinstance(obj.values[name], tuple):
+        if _isSequence(obj.values[name]):
             size = self.size * len(obj.values[name])
             if self.debug:
                 print("  calcNumBytes: size=%d len(obj.values[%s])=%d total=%d" % (
@@ -102,7 +266,12 @@ class Field(object):
         if isinstance(self.num, int):
             num = self.num
         elif obj:
-            num = getattr(obj, self.num)  # find obj."num"
+            # find obj."num", straight from the values when they're there
+            values = obj.__dict__.get('values')
+            if values is not None and self.num in values:
+                num = values[self.num]
+            else:
+                num = getattr(obj, self.num)
         # if debug: print "getting number for obj=%s, self.num=%s => num=%d" %
         # (obj.__class__.__name__,self.num,num)
         return num
@@ -115,7 +284,7 @@ class Field(object):
         return False
 
     def calcNum(self, obj, name):
-        if isinstance(obj.values[name], list) or isinstance(obj.values[name], tuple):
+        if _isSequence(obj.values[name]):
             num = len(obj.values[name])
             # if debug: print "calcNumBytes: size=%d num=%d" % (size,len(obj.values[name]))
             # also update the linked number, if applicable
@@ -219,7 +388,7 @@ class String(Field):
             return ('', 0)
 
         size = self.getNumBytes(obj)
-        txt = data[ptr:ptr + size]
+        txt = bytes(data[ptr:ptr + size])
         if self.size == 2:
             txt = txt.decode('utf-16')  # Now is a unicode string
         if self.debug:
@@ -286,14 +455,17 @@ class List(Field):
             return (values, 0)
 
         num = self.getNum(obj)
-        while num > 0:
-            values.append(
-                struct.unpack(self.fmt, data[ptr:ptr + self.size])[0])
-            ptr += self.size
-            num -= 1
-        return (values, self.getNumBytes(obj))
+        arraytype = getattr(obj, 'arraytype', None)
+        if arraytype and self.hasNumReference():
+            values = _unpackArray(self.fmt, data, ptr, num, arraytype)
+            return (values, self.size * num)
+        if num > 0:
+            values = _unpackList(self.fmt, data, ptr, num)
+        return (values, self.size * num)
 
     def pack(self, obj, name, value):
+        if _isArray(value):
+            return _packArray(self.fmt, value)
         fh = BytesIO()
         size = 0
         for val in value:
@@ -339,15 +511,25 @@ class Tuples(Field):
         if self.debug:
             print("unpack: name=%s num=%d ptr=%d datasize=%d" %
                   (name, num, ptr, len(data)))
-        while num > 0:
-            values.append(
-                list(struct.unpack(self.fmt, data[ptr:ptr + self.size])))
-            ptr += self.size
-            num -= 1
-        return (values, self.getNumBytes(obj))
-
-    # assuming a list of lists
+        arraytype = getattr(obj, 'arraytype', None)
+        rank = self.rank
+        if arraytype and self.hasNumReference():
+            # variable length point lists are decoded in one go
+            values = _unpackArray(self.fmt, data, ptr, num * rank, arraytype)
+            if arraytype == 'numpy':
+                values = values.reshape((num, rank))
+            else:
+                values = PointArray(values, rank)
+            return (values, self.size * num)
+        if num > 0:
+            flat = _unpackList(self.fmt, data, ptr, num * rank)
+            values = [flat[i:i + rank] for i in range(0, len(flat), rank)]
+        return (values, self.size * num)
+
+    # assuming a list of lists, or one of the array representations
     def pack(self, obj, name, value):
+        if _isArray(value):
+            return _packArray(self.fmt, value)
         fh = BytesIO()
         size = 0
         if self.debug:
@@ -414,7 +596,7 @@ class EMFString(Field):
             return ('', 0)
 
         size = self.getNumBytes(obj)
-        txt = data[ptr:ptr + size]
+        txt = bytes(data[ptr:ptr + size])
         size = _roundn(len(txt), self.pad)
         if self.size == 2:
             try:
@@ -0,0 +1,387 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+from __future__ import print_function, division
+
+from builtins import range
+from builtins import object
+import array
+import mmap as _mmap
+import os
+import struct
+import sys
+
+from . import emr
+from . import meta
+from .record import _EMR_UNKNOWN
+from .compressed import GZIP_MAGIC
+from .compat import *
+
+# size of the placeable and standard headers at the start of a WMF
+_WMF_PLACEABLE_SIZE = 22
+_WMF_HEADER_SIZE = 18
+
+
+def mapFile(filename):
+    """Return a read-only memoryview of the whole file, memory-mapped
+    so that nothing is read until it is used.  An empty file gives an
+    empty view."""
+    fh = open(filename, 'rb')
+    try:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return memoryview(b'')
+        mapped = _mmap.mmap(fh.fileno(), 0, access=_mmap.ACCESS_READ)
+    finally:
+        fh.close()
+    return memoryview(mapped)
+
+
+class RecordIndex(object):
+
+    """
+Table of the type, offset and size of every record in an EMF or WMF
+file, built by scanning only the record headers.  With an index any
+single record can be decoded straight from the file (see L{EMF.record})
+without unserializing the records before it.
+
+The index can be written to a small sidecar file, by default the name
+of the metafile with '.idx' appended, and read back by later sessions.
+The sidecar remembers the size and modification time of the metafile
+so an out of date index can be detected with L{isCurrent}.
+
+Record numbers match the positions in L{EMF.records}.  In a WMF the
+placeable header and the standard header are records 0 and 1.
+    """
+
+    magic = b'PYEMFIDX'
+    version = 1
+
+    # magic, version, wmf flag, number of records, metafile size and
+    # modification time in nanoseconds
+    _header = struct.Struct("<8sHHqqq")
+
+    def __init__(self, wmf=False):
+        self.filename = None
+        self.wmf = wmf
+        self.filesize = 0
+        self.mtime = 0
+
+        self.types = array.array('i')
+        self.offsets = array.array('q')
+        self.sizes = array.array('I')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """Return the (iType, offset, nSize) of record i."""
+        return (self.types[i], self.offsets[i], self.sizes[i])
+
+    def __iter__(self):
+        """Iterate over (record number, iType, offset, nSize)."""
+        for i in range(len(self.offsets)):
+            yield (i, self.types[i], self.offsets[i], self.sizes[i])
+
+    @classmethod
+    def build(cls, filename, wmf=None):
+        """
+Scan a metafile and index its records.  Only the 8 byte EMF (or 6 byte
+WMF) record headers are read.
+
+@param filename: metafile to index
+@type filename: string
+@param wmf: True for a WMF, False for an EMF, or None to look at the
+start of the file.
+@type wmf: Boolean
+@return: the new index
+@rtype: L{RecordIndex}
+        """
+        view = mapFile(filename)
+        if bytes(view[:2]) == GZIP_MAGIC:
+            raise ValueError("%s is compressed and can't be indexed" % filename)
+        if wmf is None:
+            wmf = len(view) >= 4 and struct.unpack_from("<I", view)[0] != emr._HEADER.emr_id
+        index = cls(wmf)
+        index._stamp(filename)
+        if wmf:
+            index._scanWMF(view)
+        else:
+            index._scanEMF(view)
+        return index
+
+    @classmethod
+    def open(cls, filename, wmf=None, index=None):
+        """
+Find the index to use for random access to a metafile, as done by
+L{EMF.loadIndex} and L{WMF.loadIndex}.
+
+@param filename: the metafile
+@type filename: string
+@param wmf: see L{build}
+@type wmf: Boolean
+@param index: a L{RecordIndex}, which is returned as it is, or the
+name of an index file written by L{save}.  If None, the L{sidecar}
+index is used when it is up to date; otherwise the file is indexed by
+scanning the record headers.
+@type index: L{RecordIndex} or string
+@return: the index
+@rtype: L{RecordIndex}
+        """
+        if isinstance(index, (str, cunicode)):
+            return cls.load(index, filename)
+        if index is not None:
+            return index
+        sidecar = cls.sidecar(filename)
+        if os.path.exists(sidecar):
+            index = cls.load(sidecar, filename)
+            if index.isCurrent():
+                return index
+        return cls.build(filename, wmf)
+
+    @classmethod
+    def patchLoaded(cls, filename, records, i, e=None, wmf=None, index=None):
+        """
+Patch record i of a metafile whose records have all been loaded into
+records, as done by L{EMF.patch} and L{WMF.patch}.  The record offsets
+come from index if it is still current, or from a new scan of the
+file; callers keep the returned index so the next patch doesn't have
+to scan again.
+
+@param filename: the metafile the records were loaded from
+@type filename: string
+@param records: the loaded records; record i is replaced by e
+@type records: list
+@param i: record number; negative numbers count from the end
+@type i: int
+@param e: the replacement record, by default records[i]
+@param wmf: see L{build}
+@type wmf: Boolean
+@param index: index returned by an earlier call, or None
+@type index: L{RecordIndex}
+@return: the index used
+@rtype: L{RecordIndex}
+@raise ValueError: if the record size would change, or the file no
+longer has the same number of records
+        """
+        if e is None:
+            e = records[i]
+        if index is None or not index.isCurrent(filename):
+            index = cls.build(filename, wmf)
+        if len(index) != len(records):
+            raise ValueError("%s no longer matches the loaded records" %
+                             filename)
+        index.patch(i, e, filename)
+        records[i] = e
+        return index
+
+    def _stamp(self, filename):
+        self.filename = filename
+        st = os.stat(filename)
+        self.filesize = st.st_size
+        self.mtime = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
+
+    def _scanEMF(self, view):
+        types = self.types
+        offsets = self.offsets
+        sizes = self.sizes
+        unpack = struct.Struct("<iI").unpack_from
+        ptr = 0
+        end = len(view) - 8
+        while ptr <= end:
+            (iType, nSize) = unpack(view, ptr)
+            types.append(iType)
+            offsets.append(ptr)
+            sizes.append(nSize)
+            # a record can never be shorter than its own header
+            ptr += max(nSize, 8)
+
+    def _scanWMF(self, view):
+        types = self.types
+        offsets = self.offsets
+        sizes = self.sizes
+        ptr = 0
+        for size in (_WMF_PLACEABLE_SIZE, _WMF_HEADER_SIZE):
+            if ptr + size > len(view):
+                return
+            # the loader gives both headers an iType of 1
+            types.append(1)
+            offsets.append(ptr)
+            sizes.append(size)
+            ptr += size
+        unpack = struct.Struct("<IH").unpack_from
+        end = len(view) - 6
+        while ptr <= end:
+            (count, sType) = unpack(view, ptr)
+            types.append(sType)
+            offsets.append(ptr)
+            sizes.append(count * 2)
+            ptr += max(count * 2, 6)
+
+    def patch(self, i, e, filename=None):
+        """
+Overwrite record i in the indexed metafile with the record e, writing
+only that record's bytes.  This is only possible when e packs to
+exactly the size of the record it replaces; anything else would move
+the records after it, so the whole file would have to be saved.
+
+The index is updated with the new modification time of the file so
+that it stays current.
+
+@param i: record number; negative numbers count from the end
+@type i: int
+@param e: the replacement record
+@param filename: metafile to patch; defaults to the indexed file
+@type filename: string
+@raise ValueError: if e doesn't fit the space of record i
+        """
+        if filename is None:
+            filename = self.filename
+        (iType, offset, nSize) = self[i]
+        if i < 0:
+            i += len(self)
+        if e.resize() != nSize:
+            raise ValueError("record %d is %d bytes but its replacement is %d" %
+                             (i, nSize, e.nSize))
+        buf = bytearray(nSize)
+        e.serializeInto(buf, 0)
+        fh = open(filename, 'r+b')
+        try:
+            fh.seek(offset)
+            fh.write(buf)
+        finally:
+            fh.close()
+        if not self.wmf or i > 1:
+            self.types[i] = e.iType
+        self._stamp(filename)
+
+    def isCurrent(self, filename=None):
+        """Return True if the metafile still has the size and
+        modification time it had when it was indexed."""
+        if filename is None:
+            filename = self.filename
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return False
+        mtime = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
+        return st.st_size == self.filesize and mtime == self.mtime
+
+    @staticmethod
+    def sidecar(filename):
+        """Return the default index filename for a metafile."""
+        return filename + '.idx'
+
+    def save(self, filename=None):
+        """
+Write the index to a sidecar file.
+
+@param filename: index file to write; defaults to the L{sidecar} of
+the indexed metafile
+@type filename: string
+        """
+        if filename is None:
+            filename = self.sidecar(self.filename)
+        fh = open(filename, 'wb')
+        try:
+            fh.write(self._header.pack(self.magic, self.version,
+                                       int(self.wmf), len(self),
+                                       self.filesize, self.mtime))
+            for a in (self.types, self.offsets, self.sizes):
+                if sys.byteorder == 'big':
+                    a = array.array(a.typecode, a)
+                    a.byteswap()
+                fh.write(a.tobytes())
+        finally:
+            fh.close()
+
+    @classmethod
+    def load(cls, filename, metafile=None):
+        """
+Read an index written by L{save}.
+
+@param filename: index file to read
+@type filename: string
+@param metafile: name of the indexed metafile, used by L{isCurrent}
+and L{save}.  Defaults to filename without its '.idx' extension.
+@type metafile: string
+@return: the index
+@rtype: L{RecordIndex}
+        """
+        fh = open(filename, 'rb')
+        try:
+            data = fh.read()
+        finally:
+            fh.close()
+        size = cls._header.size
+        if len(data) < size:
+            raise ValueError("%s is not a record index" % filename)
+        (magic, version, wmf, count, filesize, mtime) = \
+            cls._header.unpack_from(data)
+        if magic != cls.magic or version != cls.version:
+            raise ValueError("%s is not a record index" % filename)
+        index = cls(bool(wmf))
+        if metafile is None and filename.endswith('.idx'):
+            metafile = filename[:-4]
+        index.filename = metafile
+        index.filesize = filesize
+        index.mtime = mtime
+        for a in (index.types, index.offsets, index.sizes):
+            nbytes = count * a.itemsize
+            if size + nbytes > len(data):
+                raise ValueError("%s is truncated" % filename)
+            a.frombytes(data[size:size + nbytes])
+            if sys.byteorder == 'big':
+                a.byteswap()
+            size += nbytes
+        return index
+
+    def decode(self, view, i, arraytype=None):
+        """
+Decode record i from a buffer holding the indexed metafile.
+
+@param view: the metafile contents, e.g. from L{mapFile}
+@type view: memoryview
+@param i: record number; negative numbers count from the end
+@type i: int
+@param arraytype: how point lists are decoded, see L{EMF.load}
+@type arraytype: string
+@return: the decoded record
+        """
+        (iType, offset, nSize) = self[i]
+        if i < 0:
+            i += len(self)
+        if self.wmf:
+            if i == 0:
+                e = meta.META_PLACEABLE()
+            elif i == 1:
+                e = meta.META_HEADER()
+            elif iType in meta._type_map:
+                e = meta._type_map[iType]()
+            else:
+                e = meta.META_UNKNOWN()
+        elif iType in emr._emrmap:
+            e = emr._emrmap[iType]()
+        else:
+            e = _EMR_UNKNOWN()
+        if arraytype:
+            e.arraytype = arraytype
+        e.unserialize(None, view[offset:offset + nSize], iType, nSize,
+                      e.hdrLen())
+        return e
@@ -0,0 +1,304 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+"""
+Optimizer passes that rewrite a sequence of records into a shorter one
+that draws the same picture.  Each pass is a generator over an
+iterable of records, so it can be run over L{EMF.records}, chained
+after L{iterRecords}, or fed one record at a time while streaming.
+"""
+
+from __future__ import print_function, division
+
+from builtins import object
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import emr
+from .constants import BLACK_PEN, NULL_PEN
+from .dc import _DC, _STOCK_BIT
+from .utils import _isNumpy, _pointBounds, _useShort
+
+# single line records that can be merged, and the (16 bit, 32 bit)
+# multiple line records they are merged into
+_MERGE = {
+    emr._POLYLINE: (emr._POLYPOLYLINE16, emr._POLYPOLYLINE),
+    emr._POLYLINE16: (emr._POLYPOLYLINE16, emr._POLYPOLYLINE),
+    emr._POLYGON: (emr._POLYPOLYGON16, emr._POLYPOLYGON),
+    emr._POLYGON16: (emr._POLYPOLYGON16, emr._POLYPOLYGON),
+}
+
+
+# mode setting records, and the field holding the value they set
+_MODES = {
+    emr._SETMAPMODE: 'iMode',
+    emr._SETBKMODE: 'iMode',
+    emr._SETPOLYFILLMODE: 'iMode',
+    emr._SETROP2: 'iMode',
+    emr._SETSTRETCHBLTMODE: 'iMode',
+    emr._SETTEXTALIGN: 'iMode',
+    emr._SETTEXTCOLOR: 'crColor',
+    emr._SETBKCOLOR: 'crColor',
+    emr._SETARCDIRECTION: 'iArcDirection',
+}
+
+
+def _overlaps(a, b):
+    return (a[0][0] <= b[1][0] and b[0][0] <= a[1][0] and
+            a[0][1] <= b[1][1] and b[0][1] <= a[1][1])
+
+
+def _inflate(bounds, margin):
+    return [[bounds[0][0] - margin, bounds[0][1] - margin],
+            [bounds[1][0] + margin, bounds[1][1] + margin]]
+
+
+class Coalescer(object):
+
+    """
+Merge runs of consecutive L{emr._POLYLINE16}/L{emr._POLYLINE} records
+into one L{emr._POLYPOLYLINE16}, and runs of polygons into one
+L{emr._POLYPOLYGON16}, saving a record header and bounds per line and
+the dispatch overhead in the viewer.  The merged record uses the 32
+bit form only if its points don't fit in 16 bits.
+
+A polygon is only added to a run if its bounds, grown by the width of
+the selected pen, don't touch those of any polygon already in it: in a
+polypolygon, overlapping polygons are filled together and could cancel
+each other out, and all the fills are drawn before the outlines.  The
+selected pen is followed through the object records, SaveDC and
+RestoreDC with a L{_DC}; while its width isn't known, polygons aren't
+merged.  Records between BeginPath and EndPath are left alone.
+
+Records are handed in one at a time with L{push}, which returns the
+records that are ready to be written; L{flush} returns the rest.
+    """
+
+    def __init__(self):
+        self.run = []
+        self.runbounds = []
+        self.inpath = False
+        # only the object table and selections are used, see
+        # StateFilter; a new DC starts with the black pen selected
+        self.dc = _DC(6.0, 4.0, 72)
+        self.dc.selectObject(BLACK_PEN | _STOCK_BIT)
+
+    def push(self, e):
+        """Add the next record, and return the list of records that can
+        now be output."""
+        cls = e.__class__
+        if isinstance(e, emr._BEGINPATH):
+            self.inpath = True
+        elif isinstance(e, (emr._ENDPATH, emr._ABORTPATH)):
+            self.inpath = False
+        elif cls in _MERGE and not self.inpath:
+            out = []
+            if self.run and _MERGE[self.run[0].__class__] != _MERGE[cls]:
+                out = self.flush()
+            if _MERGE[cls][1] is emr._POLYPOLYGON:
+                # read from values so a record that isn't merged stays
+                # unchanged, see record.original()
+                aptl = e.values['aptl']
+                width = self._penWidth()
+                if width is None or not len(aptl):
+                    bounds = None
+                else:
+                    bounds = _inflate(_pointBounds(aptl), width)
+                if bounds is None or any(_overlaps(bounds, b)
+                                         for b in self.runbounds):
+                    out.extend(self.flush())
+                if bounds is not None:
+                    self.runbounds.append(bounds)
+            self.run.append(e)
+            return out
+        out = self.flush()
+        self._trackPen(e)
+        out.append(e)
+        return out
+
+    def _trackPen(self, e):
+        """Follow the object table and selections, for L{_penWidth}."""
+        cls = e.__class__
+        dc = self.dc
+        if cls is emr._SELECTOBJECT:
+            dc.selectObject(e.handle)
+        elif cls is emr._DELETEOBJECT:
+            dc.forgetObject(e.handle)
+            try:
+                dc.removeObject(e.handle)
+            except IndexError:
+                pass
+        elif cls is emr._SAVEDC:
+            dc.saveState()
+        elif cls is emr._RESTOREDC:
+            dc.restoreState(e.iRelative)
+        elif e.hasHandle():
+            dc.forgetObject(e.handle)
+            dc.addObject(e, e.handle)
+
+    def _penWidth(self):
+        """Return the width of the selected pen in logical units, or
+        None if it isn't known."""
+        handle = self.dc.selected.get('pen')
+        if handle is None:
+            return None
+        if handle & _STOCK_BIT:
+            return 0 if handle == NULL_PEN | _STOCK_BIT else 1
+        pen = self.dc.objects[handle]
+        if isinstance(pen, emr._CREATEPEN):
+            return max(pen.lopn_width, 1)
+        # the extended pen is kept as raw data: the bitmap offsets and
+        # sizes, then the style and the width
+        data = pen.unhandleddata
+        if data is None or len(data) < 24:
+            return None
+        return max(struct.unpack_from('<i', data, 20)[0], 1)
+
+    def flush(self):
+        """Return the records held back in the current run, merged if
+        there is more than one."""
+        run = self.run
+        self.run = []
+        self.runbounds = []
+        if len(run) < 2:
+            return run
+        return [self._merge(run)]
+
+    def _merge(self, run):
+        (cls16, cls) = _MERGE[run[0].__class__]
+        parts = [e.values['aptl'] for e in run]
+        counts = [len(aptl) for aptl in parts]
+        if all(_isNumpy(aptl) for aptl in parts):
+            points = numpy.concatenate(parts)
+        else:
+            points = []
+            for aptl in parts:
+                if _isNumpy(aptl):
+                    aptl = aptl.tolist()
+                points.extend(aptl)
+        bounds = _pointBounds(points)
+        if _useShort(bounds):
+            return cls16(points, counts, bounds)
+        return cls(points, counts, bounds)
+
+
+def coalesce(records):
+    """
+Generator that merges runs of polylines and polygons, see
+L{Coalescer}.
+
+@param records: iterable of records
+@return: generator of records
+    """
+    merger = Coalescer()
+    for e in records:
+        for out in merger.push(e):
+            yield out
+    for out in merger.flush():
+        yield out
+
+
+class StateFilter(object):
+
+    """
+Drop records that don't change the drawing state: selecting the
+object that is already selected, setting a mode or color to its
+current value, and a SaveDC followed directly by its RestoreDC.
+
+The state is followed with a L{_DC}, including the objects in the
+handle table and the stack of states saved by SaveDC.  Nothing is
+assumed about the state before it is first set, so only records that
+repeat an earlier one are dropped.  Records are handed in and out as
+with L{Coalescer}.
+    """
+
+    def __init__(self):
+        # only the object table and drawing state are used, so the size
+        # doesn't matter
+        self.dc = _DC(6.0, 4.0, 72)
+        # SaveDC records held back until it is known whether anything
+        # happens before the matching RestoreDC
+        self.saves = []
+
+    def push(self, e):
+        """Add the next record, and return the list of records that can
+        now be output."""
+        cls = e.__class__
+        dc = self.dc
+        if cls is emr._SAVEDC:
+            self.saves.append(e)
+            return []
+        if cls is emr._RESTOREDC and self.saves and e.iRelative == -1:
+            self.saves.pop()
+            return []
+        if cls in _MODES:
+            value = getattr(e, _MODES[cls])
+            if dc.hasMode(e.iType, value):
+                return []
+        elif cls is emr._SELECTOBJECT:
+            if dc.isSelected(e.handle):
+                return []
+
+        out = self.flush()
+        if cls in _MODES:
+            dc.setMode(e.iType, value)
+        elif cls is emr._SELECTOBJECT:
+            dc.selectObject(e.handle)
+        elif cls is emr._DELETEOBJECT:
+            dc.forgetObject(e.handle)
+            try:
+                dc.removeObject(e.handle)
+            except IndexError:
+                pass
+        elif cls is emr._RESTOREDC:
+            dc.restoreState(e.iRelative)
+        elif e.hasHandle():
+            dc.forgetObject(e.handle)
+            dc.addObject(e, e.handle)
+        out.append(e)
+        return out
+
+    def flush(self):
+        """Return the SaveDC records held back."""
+        out = self.saves
+        self.saves = []
+        for e in out:
+            self.dc.saveState()
+        return out
+
+
+def dropRedundant(records):
+    """
+Generator that leaves out records that don't change the drawing
+state, see L{StateFilter}.
+
+@param records: iterable of records
+@return: generator of records
+    """
+    stage = StateFilter()
+    for e in records:
+        for out in stage.push(e):
+            yield out
+    for out in stage.flush():
+        yield out
@@ -0,0 +1,164 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+from __future__ import print_function, division
+
+from builtins import object
+import struct
+
+from . import emr
+from . import meta
+from .compat import *
+from .compressed import isCompressed, openRead, openBuffer
+
+# bytes read in one go by probe; enough for any EMF header with a
+# reasonable description, and always enough for the WMF headers
+PROBE_SIZE = 4096
+
+_WMF_KEY = 0x9ac6cdd7
+
+# size of the WMF standard header in 16 bit words
+_WMF_HEADER_WORDS = 9
+
+
+class MetafileInfo(object):
+
+    """
+Summary of a metafile taken from its header records only, as returned
+by L{probe}.
+
+@ivar filename: name of the probed file, or None
+@ivar wmf: True for a WMF, False for an EMF
+@ivar bounds: bounding rectangle ((left, top), (right, bottom)) in
+device units
+@ivar frame: picture frame in .01 millimeter units (EMF only)
+@ivar nBytes: size of the metafile in bytes
+@ivar nRecords: number of records (EMF only)
+@ivar nHandles: number of entries in the handle table
+@ivar description: description string with its trailing NULs removed
+(EMF only)
+@ivar header: the decoded L{emr._HEADER} or L{meta.META_HEADER}
+@ivar placeable: the decoded L{meta.META_PLACEABLE} of a placeable
+WMF, or None
+    """
+
+    def __init__(self, filename=None, wmf=False):
+        self.filename = filename
+        self.wmf = wmf
+        self.bounds = None
+        self.frame = None
+        self.nBytes = 0
+        self.nRecords = None
+        self.nHandles = 0
+        self.description = u''
+        self.header = None
+        self.placeable = None
+
+    def __repr__(self):
+        return "<MetafileInfo %s %s bounds=%s nBytes=%d nRecords=%s nHandles=%d>" % (
+            "WMF" if self.wmf else "EMF", self.filename, self.bounds,
+            self.nBytes, self.nRecords, self.nHandles)
+
+
+def _decode(cls, data, itype, nsize, ptr):
+    e = cls()
+    e.unserialize(None, data, itype, nsize, ptr)
+    return e
+
+
+def _probeEMF(info, data, fh):
+    (iType, nSize) = struct.unpack_from("<ii", data)
+    if nSize > len(data) and fh is not None:
+        data += fh.read(nSize - len(data))
+    if nSize > len(data):
+        raise EOFError("EMF header is truncated")
+    hdr = _decode(emr._HEADER, memoryview(data)[:nSize], iType, nSize, 8)
+    if hdr.dSignature != emr._HEADER.format.default['dSignature']:
+        raise ValueError("not an EMF: the header has no EMF signature")
+    info.header = hdr
+    info.bounds = hdr.rclBounds
+    info.frame = hdr.rclFrame
+    info.nBytes = hdr.nBytes
+    info.nRecords = hdr.nRecords
+    info.nHandles = hdr.nHandles
+    info.description = hdr.description.rstrip(u'\0')
+
+
+def _probeWMF(info, data):
+    view = memoryview(data)
+    ptr = 0
+    if struct.unpack_from("<I", view)[0] == _WMF_KEY:
+        info.placeable = _decode(meta.META_PLACEABLE, view[:22], 1, 22, 0)
+        info.bounds = info.placeable.rclBounds
+        ptr = 22
+    if ptr + 18 > len(view):
+        raise EOFError("WMF header is truncated")
+    hdr = _decode(meta.META_HEADER, view[ptr:ptr + 18], 1, 18, 0)
+    if hdr.sHeaderSize != _WMF_HEADER_WORDS:
+        raise ValueError("not a metafile: neither an EMF nor a WMF header")
+    info.header = hdr
+    # the size is stored as a count of 16 bit words
+    info.nBytes = ((hdr.sSizeHigh << 16) | hdr.sSizeLow) * 2
+    info.nHandles = hdr.sNumberOfObjects
+
+
+def probe(source):
+    """
+Read the metadata of an EMF or WMF without loading it.  Only the
+header records at the start of the file are read, with a single fixed
+size read for all but the most unusual files, and decoded.
+
+@param source: filename, file-like object opened in binary mode, or
+any object supporting the buffer protocol (bytes, mmap, ...).  Gzip
+compressed (.emz/.wmz) files, buffers and file-like objects are
+decompressed only as far as the headers.
+@return: the header information
+@rtype: L{MetafileInfo}
+@raise EOFError: if the file ends within the headers
+@raise ValueError: if the file doesn't start with an EMF or WMF header
+    """
+    filename = None
+    fh = None
+    if isinstance(source, (str, cunicode)) or hasattr(source, '__fspath__'):
+        filename = source
+        fh = openRead(source, PROBE_SIZE)
+        source = fh
+    elif isCompressed(source):
+        fh = openBuffer(source, PROBE_SIZE)
+        source = fh
+    try:
+        if hasattr(source, 'read'):
+            data = source.read(PROBE_SIZE)
+            reader = source
+        else:
+            data = memoryview(source).cast('B')
+            reader = None
+        if len(data) < 8:
+            raise EOFError("file too short to be a metafile")
+        iType = struct.unpack_from("<i", data)[0]
+        info = MetafileInfo(filename, iType != emr._HEADER.emr_id)
+        if info.wmf:
+            _probeWMF(info, data)
+        else:
+            _probeEMF(info, data, reader)
+        return info
+    finally:
+        if fh is not None:
+            fh.close()
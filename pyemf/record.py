@@ -22,11 +22,23 @@ from __future__ import print_function, division
 
 from builtins import str
 from builtins import object
+from builtins import range
 import struct
+import sys
 
-from .field import Field, StructFormat
+from .field import Field, StructFormat, List, Tuples, struct_pack
 from .compat import StringIO, BytesIO
 
+# field values that can't be changed in place
+_immutable = (int, float, str, bytes)
+
+# attributes other than the typedef fields that change the serialized
+# record
+_content = ('iType', 'unhandleddata')
+
+# byte order of the unprefixed formats of List and Tuples fields
+_native = '<' if sys.byteorder == 'little' else '>'
+
 # Factory for a bunch of flyweight Struct objects
 fmtfactory = {}
 
@@ -59,6 +71,12 @@ class RecordFormat(object):
         self.debug = 0
 
         self.fmt = ''
+
+        # compiled codec: list of segments, see _compile
+        self.segments = None
+        # total size of the fixed size segments
+        self.fixedsize = 0
+
         self.setFormat(typedef)
 
     def getDefaults(self):
@@ -80,11 +98,133 @@ class RecordFormat(object):
                 self.appendFormat(typecode, name, default)
         elif typedef:
             raise AttributeError("format must be a list")
+        self._compile()
         if self.debug:
             print(
                 "current struct=%s size=%d\n  names=%s" % (
                     self.fmt, self.minstructsize, self.names))
 
+    def _compile(self):
+        """Build the specialized codec used by L{unpack}, L{pack} and
+        L{calcNumBytes}.  Each run of consecutive fixed size fields --
+        scalars, and List and Tuples fields with a fixed count such as
+        the rclBounds of most drawing records -- is merged into a
+        single precompiled struct.Struct, stored as a (struct, names,
+        fmt, layout) segment.  layout is None if the run only has
+        scalars, and otherwise lists (name, start, count, rank) for
+        each field, see L{_unpackRun}.  Every other field is kept as a
+        (None, name, field, None) segment and handled by its own unpack
+        and pack methods.
+
+        Packing with segments assumes that offset and count references
+        always point at scalar fields, which is true for every EMF and
+        WMF record.  If a typedef breaks that assumption the codec is
+        not compiled and the generic field-by-field code is used."""
+        self.segments = None
+        self.fixedsize = 0
+        segments = []
+        runfmt = ''
+        runnames = []
+        layout = []
+        fixed = False
+        for name in self.names:
+            fmt = self.fmtmap[name]
+            item = self._fixedItem(fmt)
+            if item is not None:
+                (order, codes, count, rank) = item
+                if runnames and order != runfmt[0]:
+                    segments.append(self._run(runfmt, runnames, layout, fixed))
+                    runnames = []
+                if not runnames:
+                    runfmt = order
+                    layout = []
+                    fixed = False
+                    # number of values unpacked by the run so far
+                    start = 0
+                runfmt += codes
+                runnames.append(name)
+                layout.append((name, start, count, rank))
+                if count is None:
+                    start += 1
+                else:
+                    start += count * (rank or 1)
+                    fixed = True
+                continue
+            if runnames:
+                segments.append(self._run(runfmt, runnames, layout, fixed))
+                runfmt = ''
+                runnames = []
+            for refname in (fmt.hasOffsetReference(), fmt.hasNumReference()):
+                if refname and not isinstance(self.fmtmap.get(refname), StructFormat):
+                    return
+            segments.append((None, name, fmt, None))
+        if runnames:
+            segments.append(self._run(runfmt, runnames, layout, fixed))
+        self.segments = segments
+        self.fixedsize = sum([seg[0].size for seg in segments if seg[0]])
+
+    @staticmethod
+    def _fixedItem(fmt):
+        """Return (byte order, struct codes, count, rank) if the field
+        fmt can be part of a compiled run, or None.  count is None for
+        a scalar, and rank is None for a flat List."""
+        if isinstance(fmt, StructFormat):
+            if fmt.fmt[0] in "<>!=":
+                return (fmt.fmt[0], fmt.fmt[1:], None, None)
+            return None
+        if (isinstance(fmt, (List, Tuples)) and isinstance(fmt.num, int) and
+                fmt.offset is None):
+            codes = fmt.fmt
+            order = _native
+            if codes[0] in "<>!=@":
+                if codes[0] != '@':
+                    order = codes[0]
+                codes = codes[1:]
+            if struct.calcsize('<' + codes) != struct.calcsize(codes):
+                return None
+            rank = fmt.rank if isinstance(fmt, Tuples) else None
+            return (order, codes * fmt.num, fmt.num, rank)
+        return None
+
+    @staticmethod
+    def _run(runfmt, runnames, layout, fixed):
+        """Return the segment of a run of fixed size fields."""
+        return (struct.Struct(runfmt), tuple(runnames), runfmt,
+                tuple(layout) if fixed else None)
+
+    @staticmethod
+    def _unpackRun(values, layout, unpacked):
+        """Store the values unpacked by a run with fixed count fields,
+        rebuilding the list (or list of lists) of each such field."""
+        for (name, start, count, rank) in layout:
+            if count is None:
+                values[name] = unpacked[start]
+            elif rank is None:
+                values[name] = list(unpacked[start:start + count])
+            else:
+                values[name] = [list(unpacked[i:i + rank]) for i in
+                                range(start, start + count * rank, rank)]
+
+    @staticmethod
+    def _packRun(values, layout):
+        """Return the flat list of arguments for packing a run with
+        fixed count fields."""
+        args = []
+        for (name, start, count, rank) in layout:
+            value = values[name]
+            if count is None:
+                args.append(value)
+                continue
+            if len(value) != count:
+                raise ValueError("%s needs %d items, not %d" %
+                                 (name, count, len(value)))
+            if rank is None:
+                args.extend(value)
+            else:
+                for item in value:
+                    args.extend(item)
+        return args
+
     def appendFormat(self, typecode, name, defaultvalue):
 
         if isinstance(typecode, str):
@@ -110,6 +250,13 @@ class RecordFormat(object):
         self.names.append(name)
 
     def calcNumBytes(self, obj):
+        if self.segments is not None:
+            size = self.fixedsize
+            for (st, name, fmt, layout) in self.segments:
+                if st is None:
+                    size += fmt.calcNumBytes(obj, name)
+            return size
+
         size = 0
         for name in self.names:
             fmt = self.fmtmap[name]
@@ -126,8 +273,24 @@ class RecordFormat(object):
             if self.minstructsize + ptr > len(data):
                 # we have a problem.  More stuff to unparse than
                 # we have data.  Hmmm.  Fill with binary zeros
-                # till I think of a better idea.
-                data += b"\0" * (self.minstructsize + ptr - len(data))
+                # till I think of a better idea.  (data may be a
+                # memoryview, which can't be extended in place.)
+                data = bytes(data) + b"\0" * (self.minstructsize + ptr - len(data))
+            if self.segments is not None:
+                values = obj.values
+                for (st, name, fmt, layout) in self.segments:
+                    if st is not None:
+                        if layout is None:
+                            values.update(zip(name, st.unpack_from(data, ptr)))
+                        else:
+                            self._unpackRun(values, layout,
+                                            st.unpack_from(data, ptr))
+                        ptr += st.size
+                    else:
+                        (value, size) = fmt.unpack(obj, name, data, ptr)
+                        values[name] = value
+                        ptr += size
+                return ptr
             for name in self.names:
                 fmt = self.fmtmap[name]
                 (value, size) = fmt.unpack(obj, name, data, ptr)
@@ -139,6 +302,9 @@ class RecordFormat(object):
         return ptr
 
     def pack(self, values, obj, alreadypacked=0):
+        if self.segments is not None:
+            return self._packSegments(values, obj, alreadypacked)
+
         fh = BytesIO()
         size = 0
         output = {}
@@ -185,6 +351,87 @@ class RecordFormat(object):
             fh.write(output[name])
         return fh.getvalue()
 
+    def packInto(self, buf, offset, values, obj, alreadypacked=0):
+        """Like L{pack}, but write the packed fields into the
+        writable buffer buf starting at offset, and return the offset
+        just past them.  With the compiled codec the scalar runs are
+        packed in place without building an intermediate string."""
+        if self.segments is None:
+            data = self.pack(values, obj, alreadypacked)
+            buf[offset:offset + len(data)] = data
+            return offset + len(data)
+        (output, size) = self._packVariable(values, obj, alreadypacked)
+        self._fillSegments(buf, offset, values, obj, output)
+        return offset + size
+
+    def _packSegments(self, values, obj, alreadypacked):
+        """Compiled version of L{pack}.  The variable length fields are
+        packed first so that the offsets and counts they refer to are
+        known, then every scalar run is packed with its final values in
+        a single pack_into call."""
+        (output, size) = self._packVariable(values, obj, alreadypacked)
+        buf = bytearray(size)
+        self._fillSegments(buf, 0, values, obj, output)
+        return bytes(buf)
+
+    def _packVariable(self, values, obj, alreadypacked):
+        """First pass of the compiled pack: pack the variable length
+        fields and update the offsets and counts that refer to them.
+        Returns the list of packed data (None for the scalar runs) and
+        the total size of the record fields."""
+        size = 0
+        output = []
+
+        for (st, name, fmt, layout) in self.segments:
+            if st is not None:
+                output.append(None)
+                size += st.size
+                continue
+            try:
+                data = fmt.pack(obj, name, values[name])
+            except:
+                print("Exception while trying to pack %s for object:" % name)
+                print(obj)
+                raise
+
+            # offsets and counts of variable length fields are
+            # updated the same way as the generic pack
+            refname = fmt.hasOffsetReference()
+            if refname and data:
+                values[refname] = size + alreadypacked
+            refname = fmt.hasNumReference()
+            if refname and data:
+                values[refname] = fmt.calcNum(obj, name)
+
+            output.append(data)
+            size += len(data)
+        return (output, size)
+
+    def _fillSegments(self, buf, ptr, values, obj, output):
+        """Second pass of the compiled pack: write the scalar runs and
+        the packed variable length fields into buf at ptr."""
+        for (st, name, fmt, layout), data in zip(self.segments, output):
+            if st is not None:
+                if layout is None:
+                    args = [values[n] for n in name]
+                else:
+                    args = self._packRun(values, layout)
+                try:
+                    st.pack_into(buf, ptr, *args)
+                except struct.error:
+                    # let struct_pack deal with float to int conversion
+                    try:
+                        buf[ptr:ptr + st.size] = struct_pack(fmt, *args)
+                    except:
+                        print("Exception while trying to pack %s for object:" % ", ".join(name))
+                        print(obj)
+                        raise
+                ptr += st.size
+            else:
+                buf[ptr:ptr + len(data)] = data
+                ptr += len(data)
+        return ptr
+
     def getString(self, obj):
         txt = StringIO()
 
@@ -207,28 +454,53 @@ class Record(object):
     typedef = ()
 
     def __init__(self):
+        self._checkFormat()
+
+        # list of values parsed from the input stream
+        self.values = self.__class__.format.getDefaults()
+
+    @classmethod
+    def _checkFormat(cls):
         # if we've never seen this class before, create a new format.
         # Note that subclasses of classes that we have already seen
         # pick up any undefined class attributes from their
         # superclasses, so we have to check if this is a subclass with
         # a different typedef
-        if self.__class__.format == None or self.__class__.typedef != self.format.typedef:
+        if cls.format == None or cls.typedef != cls.format.typedef:
             # if self.debug: print "creating format for %d" % id
-            self.__class__.format = RecordFormat(self.__class__.typedef)
+            cls.format = RecordFormat(cls.typedef)
 
-        # list of values parsed from the input stream
-        self.values = self.__class__.format.getDefaults()
+    def __setstate__(self, state):
+        """Restore a pickled record, e.g. one decoded in a worker
+        process by L{EMF.load}.  The record may be the first of its
+        class in this process, so the format may not exist yet."""
+        self._checkFormat()
+        self.__dict__.update(state)
 
     def __getattr__(self, name):
         """Return EMR attribute if the name exists in the typedef list
         of the object.  This is only called when the standard
         attribute lookup fails on this object, so we don't have to
-        handle the case where name is an actual attribute of self."""
+        handle the case where name is an actual attribute of self.
+
+        Records created by L{_EMR_UNKNOWN.createLazy} are decoded here
+        on first access to anything other than iType and nSize.
+
+        Handing out a list or array value could let it be changed in
+        place, so that also counts as a change to the record, see
+        L{_EMR_UNKNOWN.original}."""
+        d = Record.__getattribute__(self, '__dict__')
+        if '_lazy' in d:
+            self.materialize()
+            return getattr(self, name)
         f = Record.__getattribute__(self, 'format')
         try:
-            if name in f.names:
+            if name in f.fmtmap:
                 v = Record.__getattribute__(self, 'values')
-                return v[name]
+                value = v[name]
+                if '_clean' in d and not isinstance(value, _immutable):
+                    del d['_clean']
+                return value
         except IndexError:
             raise IndexError(
                 "name=%s index=%d values=%s" % (name, index, str(v)))
@@ -236,18 +508,21 @@ class Record(object):
 
     def __setattr__(self, name, value):
         """Set a value in the object, propagating through to
-        self.values[] if the name is in the typedef list."""
-        f = Record.__getattribute__(self, 'format')
-        try:
-            if f and name in f.names:
-                v = Record.__getattribute__(self, 'values')
-                v[name] = value
-            else:
-                # it's not an automatically serializable item, so store it.
-                self.__dict__[name] = value
-        except IndexError:
-            raise IndexError(
-                "name=%s index=%d values=%s" % (name, index, str(v)))
+        self.values[] if the name is in the typedef list.  Setting a
+        field, the type or the extra data marks the record as changed
+        since it was read."""
+        d = self.__dict__
+        if '_lazy' in d:
+            self.materialize()
+        f = self.__class__.format
+        if f and name in f.fmtmap:
+            d.pop('_clean', None)
+            d['values'][name] = value
+        else:
+            if name in _content:
+                d.pop('_clean', None)
+            # it's not an automatically serializable item, so store it.
+            d[name] = value
 
 
 class _EMR_UNKNOWN(Record):
@@ -258,6 +533,10 @@ class _EMR_UNKNOWN(Record):
 
     twobytepadding = b'\0' * 2
 
+    # How variable length List and Points fields are decoded: None for
+    # plain lists, 'array' for array.array/PointArray, or 'numpy'
+    arraytype = None
+
     def __init__(self):
         Record.__init__(self)
         self.iType = self.__class__.emr_id
@@ -272,6 +551,35 @@ class _EMR_UNKNOWN(Record):
         # error code.  Currently just used as a boolean
         self.error = 0
 
+    @classmethod
+    def createLazy(cls, buf, offset, itype, nsize, arraytype=None):
+        """Create a record that only knows its type, size and location
+        in buf.  The record is decoded by L{materialize} the first time
+        any other attribute is read or written, so a loader can index a
+        file without paying for records that are never looked at."""
+        e = cls.__new__(cls)
+        d = e.__dict__
+        d['iType'] = itype
+        d['nSize'] = nsize
+        d['_lazy'] = (buf, offset)
+        if arraytype:
+            d['arraytype'] = arraytype
+        return e
+
+    def materialize(self):
+        """Decode a record created by L{createLazy}.  This runs the
+        same initialization and unserialize steps as an eager load, so
+        the result is indistinguishable from a fully loaded record."""
+        d = self.__dict__
+        if '_lazy' not in d:
+            return
+        (buf, offset) = d.pop('_lazy')
+        itype = d['iType']
+        nsize = d['nSize']
+        self.__class__.__init__(self)
+        self.unserialize(None, buf[offset:offset + nsize], itype, nsize,
+                         self.hdrLen())
+
     def hasHandle(self):
         """Return true if this object has a handle that needs to be
         saved in the object array for later recall by SelectObject."""
@@ -300,14 +608,18 @@ class _EMR_UNKNOWN(Record):
 
     def getBounds(self):
         """Return bounds of object, or None if not applicable."""
-        if 'rclBounds' in self.values:
-            return self.rclBounds
+        values = self.values
+        if 'rclBounds' in values:
+            # read from values so the record isn't marked as changed
+            return values['rclBounds']
         return None
 
     def unserialize(self, fh, already_read, itype=-1, nsize=-1, ptr=-1):
         """Read data from the file object and, using the format
         structure defined by the subclass, parse the data and store it
-        in self.values[] list."""
+        in self.values[] list.  If fh is None, already_read must hold
+        the complete record (e.g. a memoryview slice of a larger
+        buffer) and nothing more is read."""
         prevlen = len(already_read)
 
         if itype > 0:
@@ -316,13 +628,43 @@ class _EMR_UNKNOWN(Record):
         else:
             (self.iType, self.nSize) = self.readHdr(already_read)
         self.data = already_read
-        if self.nSize > prevlen:
+        if self.nSize > prevlen and fh is not None:
             self.data += fh.read(self.nSize - prevlen)
         if ptr < 0:
             ptr = prevlen
         last = self.format.unpack(self.data, self, ptr)
         if self.nSize > last:
             self.unserializeExtra(self.data[last:])
+        # nothing has been changed yet, see original().  Records that
+        # keep part of their content in plain attributes (text, bitmaps)
+        # can't tell when that changes, so they are always packed again.
+        if not self.keepsExtra():
+            self.__dict__['_clean'] = True
+
+    @classmethod
+    def keepsExtra(cls):
+        """Return True if the class handles data outside the typedef
+        fields itself, by overriding any of the *Extra hooks."""
+        return (cls.unserializeExtra is not _EMR_UNKNOWN.unserializeExtra or
+                cls.serializeExtra is not _EMR_UNKNOWN.serializeExtra or
+                cls.sizeExtra is not _EMR_UNKNOWN.sizeExtra)
+
+    def original(self):
+        """Return the bytes this record was read from, or None if it
+        wasn't read from a file or a field has been changed (or handed
+        out as a list that could be changed) since.  Unchanged records
+        are saved by copying these bytes rather than packing the fields
+        again.  Changes made directly to self.values aren't noticed, which
+is how the library's own readers avoid marking records changed."""
+        d = self.__dict__
+        if '_lazy' in d:
+            (buf, offset) = d['_lazy']
+            return buf[offset:offset + d['nSize']]
+        if '_clean' in d:
+            data = d.get('data')
+            if data is not None and len(data) == d['nSize']:
+                return data
+        return None
 
     def readHdr(self, already_read):
         return struct.unpack("<ii", already_read)
@@ -334,6 +676,10 @@ class _EMR_UNKNOWN(Record):
         pass
 
     def serialize(self, fh):
+        data = self.original()
+        if data is not None:
+            fh.write(data)
+            return
         try:
             # print "packing!"
             bytes = self.format.pack(self.values, self, self.hdrLen())
@@ -352,6 +698,43 @@ class _EMR_UNKNOWN(Record):
         fh.write(bytes)
         self.serializeExtra(fh)
 
+    def serializeInto(self, buf, offset):
+        """Write the record into the writable buffer buf at offset,
+        without any intermediate strings, and return the offset just
+        past it.  L{resize} must have been called first, and buf must
+        have room for nSize bytes.  Records that write their header or
+        extra data themselves are packed with L{serialize}."""
+        data = self.original()
+        if data is not None:
+            buf[offset:offset + len(data)] = data
+            return offset + len(data)
+        cls = self.__class__
+        if (cls.writeHdr is not _EMR_UNKNOWN.writeHdr or
+                cls.serializeExtra is not _EMR_UNKNOWN.serializeExtra):
+            fh = BytesIO()
+            self.serialize(fh)
+            data = fh.getvalue()
+            buf[offset:offset + len(data)] = data
+            return offset + len(data)
+
+        hdrlen = self.hdrLen()
+        try:
+            ptr = self.format.packInto(buf, offset + hdrlen, self.values,
+                                       self, hdrlen)
+        except struct.error:
+            print("!!!!!Struct error:", end=' ')
+            print(self)
+            raise
+        if self.unhandleddata:
+            extra = len(self.unhandleddata)
+            buf[ptr:ptr + extra] = self.unhandleddata
+            ptr += extra
+        if ptr - offset != self.nSize:
+            raise TypeError("%s packed to %d bytes, resize gave %d" % (
+                cls.__name__, ptr - offset, self.nSize))
+        struct.pack_into("<ii", buf, offset, self.iType, self.nSize)
+        return ptr
+
     def writeHdr(self, fh):
         fh.write(struct.pack("<ii", self.iType, self.nSize))
 
@@ -363,12 +746,15 @@ class _EMR_UNKNOWN(Record):
             fh.write(self.unhandleddata)
 
     def resize(self):
+        if self.original() is not None:
+            return self.nSize
         before = self.nSize
-        self.nSize = self.hdrLen() + self.format.calcNumBytes(self) + self.sizeExtra()
+        calcSize = self.format.calcNumBytes(self)
+        self.nSize = self.hdrLen() + calcSize + self.sizeExtra()
         if self.verbose and before != self.nSize:
             print("resize: before=%d after=%d" % (before, self.nSize), end=' ')
             print(self)
-        self.verifySize(before, self.format.calcNumBytes(self))
+        self.verifySize(before, calcSize)
         return self.nSize
 
     def hdrLen(self):
@@ -0,0 +1,239 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+"""
+Douglas-Peucker simplification of polylines and polygons.
+
+Points closer than a tolerance (in logical units) to the simplified
+line are dropped, so dense data with many points per pixel shrinks to
+what can actually be seen.  The first and last point of each line are
+always kept.  With numpy the distances for each segment are computed
+in one vectorized step; without it a pure Python version is used.
+"""
+
+from __future__ import print_function, division
+
+from builtins import range
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import emr
+from .field import PointArray
+from .utils import _isNumpy
+
+# the records simplify() works on, and whether they are closed
+_LINES = {
+    emr._POLYLINE: False,
+    emr._POLYLINE16: False,
+    emr._POLYGON: True,
+    emr._POLYGON16: True,
+}
+_POLYLINES = {
+    emr._POLYPOLYLINE: False,
+    emr._POLYPOLYLINE16: False,
+    emr._POLYPOLYGON: True,
+    emr._POLYPOLYGON16: True,
+}
+
+
+def _keepNumpy(points, tolerance):
+    """Return the indices of the points kept by Douglas-Peucker."""
+    if isinstance(points, PointArray):
+        xy = numpy.array(points.data, dtype=float).reshape(-1, points.rank)
+    else:
+        xy = numpy.asarray(points, dtype=float).reshape(len(points), -1)
+    xy = xy[:, :2]
+    n = len(xy)
+    keep = numpy.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    limit = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        (start, end) = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        rel = xy[start + 1:end] - xy[start]
+        length2 = seg.dot(seg)
+        if length2 > 0:
+            # distance to the segment, not the infinite line, so
+            # points beyond either end aren't lost
+            t = numpy.clip(rel.dot(seg) / length2, 0.0, 1.0)
+            rel = rel - t[:, numpy.newaxis] * seg
+        dist2 = (rel * rel).sum(axis=1)
+        i = int(dist2.argmax())
+        if dist2[i] > limit:
+            i += start + 1
+            keep[i] = True
+            stack.append((start, i))
+            stack.append((i, end))
+    return numpy.nonzero(keep)[0]
+
+
+def _keepPython(points, tolerance):
+    """Pure Python version of L{_keepNumpy}."""
+    n = len(points)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    limit = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        (start, end) = stack.pop()
+        if end - start < 2:
+            continue
+        (x0, y0) = points[start][0:2]
+        (x1, y1) = points[end][0:2]
+        dx = x1 - x0
+        dy = y1 - y0
+        length2 = dx * dx + dy * dy
+        best = -1.0
+        besti = start
+        for i in range(start + 1, end):
+            px = points[i][0] - x0
+            py = points[i][1] - y0
+            if length2 > 0:
+                t = (px * dx + py * dy) / length2
+                if t < 0.0:
+                    t = 0.0
+                elif t > 1.0:
+                    t = 1.0
+                px -= t * dx
+                py -= t * dy
+            dist2 = px * px + py * py
+            if dist2 > best:
+                best = dist2
+                besti = i
+        if best > limit:
+            keep[besti] = True
+            stack.append((start, besti))
+            stack.append((besti, end))
+    return [i for i in range(n) if keep[i]]
+
+
+def _take(points, keep):
+    """Return the points with the given indices, in the same form
+    (list, L{PointArray} or numpy array) as points."""
+    if _isNumpy(points):
+        return points[keep]
+    if isinstance(points, PointArray):
+        rank = points.rank
+        data = points.data
+        kept = array.array(data.typecode)
+        for i in keep:
+            kept.extend(data[i * rank:(i + 1) * rank])
+        return PointArray(kept, rank)
+    return [points[i] for i in keep]
+
+
+def simplify(points, tolerance, closed=False):
+    """
+Simplify a line with the Douglas-Peucker algorithm.
+
+@param points: list of x,y tuples, L{PointArray} or (N,2) numpy array
+@param tolerance: largest distance in logical units that a dropped
+point may be from the simplified line
+@type tolerance: float
+@param closed: True for a polygon, which is never reduced below three
+points; if it would be, it is returned unchanged
+@type closed: Boolean
+@return: the kept points, in the same form as points
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    if numpy is not None:
+        keep = _keepNumpy(points, tolerance)
+    else:
+        keep = _keepPython(points, tolerance)
+    if len(keep) == n or (closed and len(keep) < 3):
+        return points
+    return _take(points, keep)
+
+
+def simplifyParts(points, counts, tolerance, closed=False):
+    """
+Simplify several lines given as all their points one after the other
+and the number of points in each, as in L{EMF.PolyPolyline}.
+
+@return: (points, counts) of the simplified lines
+    """
+    if tolerance <= 0:
+        return (points, counts)
+    keep = []
+    newcounts = []
+    start = 0
+    for count in counts:
+        count = int(count)
+        part = points[start:start + count]
+        if count < 3:
+            kept = range(count)
+        elif numpy is not None:
+            kept = _keepNumpy(part, tolerance)
+        else:
+            kept = _keepPython(part, tolerance)
+        if closed and len(kept) < 3:
+            kept = range(count)
+        keep.extend(start + int(i) for i in kept)
+        newcounts.append(len(kept))
+        start += count
+    if len(keep) == len(points):
+        return (points, counts)
+    if _isNumpy(points):
+        keep = numpy.array(keep, dtype=int)
+    return (_take(points, keep), newcounts)
+
+
+def simplifyRecords(records, tolerance):
+    """
+Simplify the polyline, polygon, polypolyline and polypolygon records
+of a loaded metafile in place.  Their bounds are left alone, since the
+kept points are a subset of the original ones.
+
+@param records: list of records, e.g. L{EMF.records}
+@param tolerance: see L{simplify}
+@type tolerance: float
+@return: the number of points removed
+@rtype: int
+    """
+    removed = 0
+    for e in records:
+        cls = e.__class__
+        if cls in _LINES:
+            # only assigning the result marks the record as changed
+            points = e.values['aptl']
+            kept = simplify(points, tolerance, _LINES[cls])
+            if kept is not points:
+                removed += len(points) - len(kept)
+                e.aptl = kept
+                e.cptl = len(kept)
+        elif cls in _POLYLINES:
+            points = e.values['aptl']
+            (kept, counts) = simplifyParts(points, e.values['aPolyCounts'],
+                                           tolerance, _POLYLINES[cls])
+            if kept is not points:
+                removed += len(points) - len(kept)
+                e.aptl = kept
+                e.cptl = len(kept)
+                e.aPolyCounts = counts
+    return removed
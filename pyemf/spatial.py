@@ -0,0 +1,265 @@
+# Part of the pyemf library for handling EMF format files
+
+# Copyright (C) 2005 Rob McMullen
+# Copyright (C) 2016 Jeremy Sanders
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Library General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Library General Public License for more details.
+
+# You should have received a copy of the GNU Library General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA  02110-1301, USA.
+
+from __future__ import print_function, division
+
+from builtins import range
+from builtins import object
+import array
+import math
+
+from . import emr
+from .constants import *
+
+# records covering more grid cells than this are kept in a separate list
+# that every query checks, rather than being added to each cell
+_MAX_CELLS = 64
+
+
+class _TextState(object):
+
+    """
+The font height and text alignment selected by the records seen so
+far, for estimating the extent of text records.  Text written by the
+builder has empty bounds, since the size of the glyphs isn't known
+until it is drawn.
+    """
+
+    def __init__(self):
+        # font handle -> height
+        self.fonts = {}
+        self.height = 0
+        self.align = TA_TOP | TA_LEFT
+        self.saved = []
+
+    def update(self, e):
+        """Follow the state changes made by record e."""
+        if isinstance(e, emr._EXTCREATEFONTINDIRECTW):
+            self.fonts[e.values['handle']] = abs(e.values['lfHeight'])
+        elif isinstance(e, emr._DELETEOBJECT):
+            self.fonts.pop(e.values['handle'], None)
+        elif isinstance(e, emr._SELECTOBJECT):
+            height = self.fonts.get(e.values['handle'])
+            if height is not None:
+                self.height = height
+        elif isinstance(e, emr._SETTEXTALIGN):
+            self.align = e.values['iMode']
+        elif isinstance(e, emr._SAVEDC):
+            self.saved.append((self.height, self.align))
+        elif isinstance(e, emr._RESTOREDC):
+            rel = e.values['iRelative']
+            if rel < 0 and -rel <= len(self.saved):
+                (self.height, self.align) = self.saved[rel]
+                del self.saved[rel:]
+
+    def bounds(self, e):
+        """Estimate the area covered by text record e from its
+        reference point, the number of characters, and the selected
+        font and alignment.  Each character is taken to be an em wide,
+        which errs on the wide side, and rotated text isn't allowed
+        for.  Without a font only the reference point is known."""
+        values = e.values
+        x = values['ptlReference_x']
+        y = values['ptlReference_y']
+        h = self.height
+        string = values['string']
+        count = len(string)
+        if isinstance(e, emr._EXTTEXTOUTW) and isinstance(string, bytes):
+            count //= 2
+        w = h * count
+        align = self.align
+        if align & TA_CENTER == TA_CENTER:
+            (left, right) = (x - w / 2, x + w / 2)
+        elif align & TA_RIGHT:
+            (left, right) = (x - w, x)
+        else:
+            (left, right) = (x, x + w)
+        if align & TA_BASELINE == TA_BASELINE:
+            # allow a quarter of the height for the descenders
+            (top, bottom) = (y - h, y + h / 4)
+        elif align & TA_BOTTOM:
+            (top, bottom) = (y - h, y)
+        else:
+            (top, bottom) = (y, y + h)
+        return ((left, top), (right, bottom))
+
+
+def recordBounds(e, page=None, text=None):
+    """Return the drawn area of a record as ((left, top), (right,
+    bottom)), or None if it doesn't draw anything.  Ellipses,
+    rectangles and arcs only have their bounding box, and a pixel is
+    bounded by its point.  The header's bounds cover the whole picture
+    so they don't count.
+
+    Text with empty bounds (the ((0,0),(-1,-1)) 'not computed'
+    convention) is bounded by its reference point, or by an estimate
+    of its extent if text is a L{_TextState} that has seen the records
+    before it; each record passed in is also fed to text.  Any other
+    drawing record with empty bounds gets page, the bounds of the whole
+    picture, or None if page isn't given."""
+    if text is not None:
+        text.update(e)
+    if isinstance(e, emr._HEADER):
+        return None
+    if isinstance(e, emr._SETPIXELV):
+        x = e.values['ptlPixel_x']
+        y = e.values['ptlPixel_y']
+        return ((x, y), (x, y))
+    bounds = e.getBounds()
+    if not bounds and 'rclBox' in e.values:
+        bounds = e.values['rclBox']
+    if not bounds:
+        return None
+    if bounds[1][0] < bounds[0][0] or bounds[1][1] < bounds[0][1]:
+        if isinstance(e, emr._EXTTEXTOUTA):
+            if text is None:
+                text = _TextState()
+            return text.bounds(e)
+        return page
+    return bounds
+
+
+class SpatialIndex(object):
+
+    """
+Uniform grid over the bounds of a list of records, for finding the
+records that intersect a rectangle (e.g. a map tile) without looking
+at all of them.  Build it once with the record list and query it with
+L{query}; matches come back in drawing order.
+
+Records are indexed by their L{recordBounds}, so text is found by its
+estimated extent and a pixel by its point.  Records without bounds,
+such as the pen, brush and transform records, are not in the grid.
+Queries can include them so the result can be played back on its own.
+    """
+
+    def __init__(self, records, cells=None, page=None):
+        """
+Index records.
+
+@param records: list of records, e.g. L{EMF.records}
+@param cells: number of grid cells along each side; by default about
+the square root of the number of bounded records
+@type cells: int
+@param page: ((left, top), (right, bottom)) of the whole picture, used
+for drawing records with empty bounds.  If None they are treated as
+having no bounds.
+        """
+        self.records = records
+        # doubles, since the builder takes fractional coordinates too
+        self.left = array.array('d')
+        self.top = array.array('d')
+        self.right = array.array('d')
+        self.bottom = array.array('d')
+        # record numbers of the bounded records, in the same order
+        self.numbers = array.array('i')
+        self.unbounded = array.array('i')
+
+        text = _TextState()
+        for i, e in enumerate(records):
+            bounds = recordBounds(e, page, text)
+            if bounds is None:
+                self.unbounded.append(i)
+                continue
+            self.numbers.append(i)
+            self.left.append(bounds[0][0])
+            self.top.append(bounds[0][1])
+            self.right.append(bounds[1][0])
+            self.bottom.append(bounds[1][1])
+
+        self.grid = {}
+        self.large = array.array('i')
+        count = len(self.numbers)
+        if count == 0:
+            self.x0 = self.y0 = 0
+            self.cellwidth = self.cellheight = 1
+            return
+        self.x0 = min(self.left)
+        self.y0 = min(self.top)
+        if cells is None:
+            cells = int(math.sqrt(count)) + 1
+        self.cellwidth = max((max(self.right) - self.x0 + 1) / cells, 1.0)
+        self.cellheight = max((max(self.bottom) - self.y0 + 1) / cells, 1.0)
+
+        grid = self.grid
+        for j in range(count):
+            (cx0, cy0, cx1, cy1) = self._cells(self.left[j], self.top[j],
+                                               self.right[j], self.bottom[j])
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > _MAX_CELLS:
+                self.large.append(j)
+                continue
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = grid.get((cx, cy))
+                    if cell is None:
+                        cell = grid[(cx, cy)] = array.array('i')
+                    cell.append(j)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _cells(self, left, top, right, bottom):
+        """Return the range of cells covered by a rectangle."""
+        return (int((left - self.x0) // self.cellwidth),
+                int((top - self.y0) // self.cellheight),
+                int((right - self.x0) // self.cellwidth),
+                int((bottom - self.y0) // self.cellheight))
+
+    def query(self, rect, unbounded=False):
+        """
+Return the numbers of the records whose bounds intersect rect, in
+drawing order.
+
+@param rect: ((left, top), (right, bottom)) in logical units; edges
+are inclusive, as in the record bounds
+@param unbounded: also include all the records without bounds (object
+creation and selection, transforms, ...)
+@type unbounded: Boolean
+@rtype: list
+        """
+        ((left, top), (right, bottom)) = rect
+        (cx0, cy0, cx1, cy1) = self._cells(left, top, right, bottom)
+        candidates = set(self.large)
+        grid = self.grid
+        if len(grid) < (cx1 - cx0 + 1) * (cy1 - cy0 + 1):
+            # the query covers more cells than are occupied
+            for (cx, cy), cell in grid.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    candidates.update(cell)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cell = grid.get((cx, cy))
+                    if cell is not None:
+                        candidates.update(cell)
+
+        found = [self.numbers[j] for j in candidates
+                 if self.left[j] <= right and self.right[j] >= left and
+                 self.top[j] <= bottom and self.bottom[j] >= top]
+        if unbounded:
+            found.extend(self.unbounded)
+        found.sort()
+        return found
+
+    def recordsInRect(self, rect, unbounded=False):
+        """Return the records intersecting rect in drawing order, see
+        L{query}."""
+        records = self.records
+        return [records[i] for i in self.query(rect, unbounded)]
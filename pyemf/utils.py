@@ -20,6 +20,11 @@
 
 from __future__ import print_function, division
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def RGB(r, g, b):
     """
@@ -67,3 +72,43 @@ pass it through L{RGB} to generate the color value.
         return RGB(*c)
     raise TypeError(
         "Color must be specified as packed integer or 3-tuple (r,g,b)")
+
+
+def _isNumpy(value):
+    """True if value is a numpy array."""
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _pointBounds(points):
+    """Get the bounding rectangle ((left, top), (right, bottom)) for a
+    list of 2-tuples, or for an (N,2) numpy array."""
+    if _isNumpy(points):
+        (left, top) = points.min(axis=0).tolist()
+        (right, bottom) = points.max(axis=0).tolist()
+        return ((left, top), (right, bottom))
+    left = points[0][0]
+    right = left
+    top = points[0][1]
+    bottom = top
+    for x, y in points[1:]:
+        if x < left:
+            left = x
+        elif x > right:
+            right = x
+        if y < top:
+            top = y
+        elif y > bottom:
+            bottom = y
+    return ((left, top), (right, bottom))
+
+
+def _useShort(bounds):
+    """Determine if the shorter 16-bit EMR structures can be used for
+    something with these bounds, i.e. all the numbers fit within 16
+    bit integers."""
+
+    SHRT_MIN = -32768
+    SHRT_MAX = 32767
+    if bounds[0][0] >= SHRT_MIN and bounds[0][1] >= SHRT_MIN and bounds[1][0] <= SHRT_MAX and bounds[1][1] <= SHRT_MAX:
+        return True
+    return False
@@ -23,8 +23,12 @@ from __future__ import print_function, division
 
 from builtins import range
 from builtins import object
+
 from .constants import *
 from .dc import _DC
+from .compat import *
+from .index import RecordIndex, mapFile
+from .compressed import isCompressed, openRead, openBuffer, openWrite
 from . import meta
 
 
@@ -34,7 +38,7 @@ class WMF(object):
 Reference page of the public API for WMF metafile creation.  See
 L{pyemf} for an overview / mini tutorial.
 
-@group Creating Metafiles: __init__, load, save
+@group Creating Metafiles: __init__, load, loadIndex, record, patch, save
 @group Drawing Parameters: GetStockObject, SelectObject, DeleteObject, CreatePen, CreateSolidBrush, CreateHatchBrush, SetBkColor, SetBkMode, SetPolyFillMode
 @group Drawing Primitives: SetPixel, Polyline, PolyPolyline, Polygon, PolyPolygon, Rectangle, RoundRect, Ellipse, Arc, Chord, Pie, PolyBezier
 @group Path Primatives: BeginPath, EndPath, MoveTo, LineTo, PolylineTo, ArcTo,
@@ -76,6 +80,10 @@ integer coordinates.
         self.filename = None
         self.dc = _DC(width, height, density, units)
         self.records = []
+        # RecordIndex used by record() after loadIndex()
+        self.index = None
+        # record offsets of the loaded file, see patch()
+        self._patchindex = None
 
         # path recordkeeping
         self.pathstart = 0
@@ -97,21 +105,32 @@ Read an existing buffer from a string of bytes.  If any records exist
 in the current object, they will be overwritten by the records from
 this buffer.
 
-@param membuf: buffer to load
+@param membuf: buffer to load; gzip compressed (.wmz) data is
+decompressed as it is read
 @type membuf: string
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
-        fh = BytesIO(membuf)
+        self.index = None
+        if isCompressed(membuf):
+            fh = openBuffer(membuf)
+        else:
+            fh = BytesIO(membuf)
         self._load(fh)
 
-    def load(self, filename=None):
+    def load(self, filename=None, chunksize=None):
         """
 Read an existing EMF file.  If any records exist in the current
 object, they will be overwritten by the records from this file.
 
+Gzip compressed files (.wmz) are decompressed chunksize bytes at a
+time as the records are read.
+
 @param filename: filename to load
 @type filename: string
+@param chunksize: read size for compressed files, default
+L{compressed.CHUNK_SIZE}
+@type chunksize: int
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
@@ -119,9 +138,64 @@ object, they will be overwritten by the records from this file.
             self.filename = filename
 
         if self.filename:
-            fh = open(self.filename, 'rb')
+            self.index = None
+            fh = openRead(self.filename, chunksize)
             self._load(fh)
 
+    def loadIndex(self, filename=None, index=None):
+        """
+Open an existing WMF file for random access by L{record}, using a
+L{RecordIndex} instead of reading the records.  See L{EMF.loadIndex}.
+
+@param filename: filename to open
+@type filename: string
+@param index: a L{RecordIndex}, the name of an index file, or None to
+use an up to date sidecar index or scan the file.
+@type index: L{RecordIndex} or string
+        """
+        if filename:
+            self.filename = filename
+
+        self.records = []
+        self.index = RecordIndex.open(self.filename, True, index)
+        self._view = mapFile(self.filename)
+        self.scaleheader = False
+        self.dc.getBounds(self.record(0))
+
+    def record(self, i):
+        """
+Return record number i, decoded straight from the file after
+L{loadIndex}, or self.records[i] otherwise.
+
+@param i: record number; negative numbers count from the end
+@type i: int
+@return: the record
+        """
+        if self.index is None:
+            return self.records[i]
+        return self.index.decode(self._view, i)
+
+    def patch(self, i, e=None):
+        """
+Rewrite record number i in the file it was loaded from, leaving the
+rest of the file alone.  See L{EMF.patch}.
+
+@param i: record number; negative numbers count from the end
+@type i: int
+@param e: the replacement record, by default self.records[i]; it must
+be given after L{loadIndex}
+@raise ValueError: if the record size would change, or no record is
+given after L{loadIndex}
+        """
+        if self.index is None:
+            self._patchindex = RecordIndex.patchLoaded(
+                self.filename, self.records, i, e, True, self._patchindex)
+        elif e is None:
+            raise ValueError("patch() needs the replacement record after "
+                             "loadIndex(), e.g. a changed copy of record(%d)" % i)
+        else:
+            self.index.patch(i, e, self.filename)
+
     def _load(self, fh):
         self.records = []
         self._unserialize(fh)
@@ -225,12 +299,16 @@ through all the records and gather info.
             print("total: %s bytes" % size)
         header.nBytes = size
 
-    def save(self, filename=None):
+    def save(self, filename=None, compresslevel=None):
         """
 Write the EMF to disk.
 
-@param filename: filename to write
+@param filename: filename to write.  Names ending in .wmz are written
+gzip compressed.
 @type filename: string
+@param compresslevel: if given, compress the file with this gzip
+level (0-9) whatever its name
+@type compresslevel: int
 @returns: True for success, False for failure.
 @rtype: Boolean
         """
@@ -242,14 +320,15 @@ Write the EMF to disk.
 
         if self.filename:
             try:
-                fh = open(self.filename, "wb")
-                self._update_header()
-                self._serialize(fh)
-                fh.close()
-                return True
-            except:
-                raise
+                fh = openWrite(self.filename, compresslevel)
+                try:
+                    self._update_header()
+                    self._serialize(fh)
+                finally:
+                    fh.close()
+            except IOError:
                 return False
+            return True
         return False
 
     def _update_header(self):
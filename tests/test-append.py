@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Test of adding records to the end of an existing file with append().
+
+from __future__ import print_function
+from builtins import str
+import os
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+emf.save("test-append.emf")
+
+emf=pyemf.EMF()
+emf.load("test-append.emf")
+before=len(emf.records)
+header=emf.records[0]
+bounds=header.rclBounds
+frame=header.rclFrame
+
+# drawing inside the page leaves the bounds alone
+emf=pyemf.EMF(width,height,dpi)
+emf.append("test-append.emf")
+pen=emf.CreatePen(pyemf.PS_DASH,2,(0xff,0x02,0x01))
+emf.SelectObject(pen)
+emf.Polyline([(10,10),(100,200)])
+ret=emf.close()
+
+emf=pyemf.EMF()
+emf.load("test-append.emf")
+header=emf.records[0]
+assert len(emf.records)==before+3
+assert header.nRecords==len(emf.records)
+assert header.nBytes==os.path.getsize("test-append.emf")
+assert header.rclBounds==bounds and header.rclFrame==frame
+assert emf.records[-2].__class__.__name__=='_POLYLINE16'
+assert emf.records[-1].__class__.__name__=='_EOF'
+# the new pen doesn't reuse the handle of the one in the file
+assert emf.records[-4].handle!=emf.records[1].handle
+
+# drawing outside the page widens the bounds and the frame with them
+emf=pyemf.EMF(width,height,dpi)
+emf.append("test-append.emf")
+emf.Polyline([(10,10),(2*width*dpi,height*dpi)])
+emf.close()
+
+emf=pyemf.EMF()
+emf.load("test-append.emf")
+header=emf.records[0]
+assert len(emf.records)==before+4
+assert header.nBytes==os.path.getsize("test-append.emf")
+assert header.rclBounds[1][0]==2*width*dpi
+assert header.rclFrame[1][0]>frame[1][0]
+
+print("save returns %s" % str(ret))
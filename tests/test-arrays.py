@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Test of loading points into arrays, and editing them in place, and of
+# drawing from numpy arrays and from points split up by counts.
+
+from __future__ import print_function
+from builtins import str
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+ret=emf.save("test-arrays.emf")
+
+try:
+    import numpy
+    arraytypes=['array','numpy']
+except ImportError:
+    numpy=None
+    arraytypes=['array']
+
+for arrays in arraytypes:
+    for mmap in (False,True):
+        emf=pyemf.EMF()
+        emf.load("test-arrays.emf",arrays=arrays,mmap=mmap)
+        line=emf.records[1]
+        line.aptl[0]=[7,7]
+        emf.save("test-arrays.out.emf")
+        emf=pyemf.EMF()
+        emf.load("test-arrays.out.emf")
+        assert list(emf.records[1].aptl[0])==[7,7]
+
+# the same lines and polygons given as nested lists, as one list of
+# points with counts, and (if numpy is around) as arrays all give the
+# same records
+lines=[[(0,0),(10,0),(10,10)],[(20,20),(30,20)],[(40,0),(50,50),(60,0),(70,50)]]
+points=[]
+counts=[]
+for line in lines:
+    points.extend(line)
+    counts.append(len(line))
+
+nested=pyemf.EMF(width,height,dpi)
+nested.Polyline(points)
+nested.PolyPolyline(lines)
+nested.PolyPolygon(lines)
+nested.PolyPolygon([[(0,0),(100000,0),(0,10)]])
+expected=nested.tobytes()
+
+counted=pyemf.EMF(width,height,dpi)
+counted.Polyline(points)
+counted.PolyPolyline(points,counts=counts)
+counted.PolyPolygon(points,counts=counts)
+counted.PolyPolygon([(0,0),(100000,0),(0,10)],counts=[3])
+assert counted.tobytes()==expected
+assert list(counted.records[2].aPolyCounts)==counts
+
+# counts that don't cover the points exactly are an error
+for bad in ([3,2,3],[3,2,5],[]):
+    for method in (counted.PolyPolyline,counted.PolyPolygon):
+        try:
+            method(points,counts=bad)
+        except ValueError:
+            pass
+        else:
+            assert False,"counts %s accepted" % bad
+assert counted.tobytes()==expected
+
+if numpy is not None:
+    arrays=[]
+    for line in lines:
+        arrays.append(numpy.array(line))
+    numeric=pyemf.EMF(width,height,dpi)
+    numeric.Polyline(numpy.array(points))
+    numeric.PolyPolyline(arrays)
+    numeric.PolyPolygon(numpy.array(points),counts=numpy.array(counts))
+    numeric.PolyPolygon([numpy.array([(0,0),(100000,0),(0,10)])])
+    assert numeric.tobytes()==expected
+    try:
+        numeric.PolyPolyline(numpy.array(points),counts=numpy.array([3,2]))
+    except ValueError:
+        pass
+    else:
+        assert False,"short numpy counts accepted"
+    numeric.save("test-arrays-numpy.emf")
+
+print("save returns %s" % str(ret))
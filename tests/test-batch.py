@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+# Test of converting a directory tree of metafiles with pyemf.batch.
+
+from __future__ import print_function
+from builtins import str
+import os
+import shutil
+import tempfile
+import pyemf
+from pyemf.batch import batch
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+ret=emf.save("test-batch.emf")
+
+tmp=tempfile.mkdtemp()
+try:
+    # files of the same name in different directories
+    for sub in ("x","y"):
+        os.makedirs(os.path.join(tmp,"in",sub))
+        shutil.copy("test-batch.emf",os.path.join(tmp,"in",sub,"same.emf"))
+    out=os.path.join(tmp,"out")
+    report=batch([os.path.join(tmp,"in")],'convert',out,workers=1)
+    assert report.errors==0
+    for sub in ("x","y"):
+        assert os.path.exists(os.path.join(out,sub,"same.emf"))
+
+    # given as files they would overwrite each other
+    try:
+        batch([os.path.join(tmp,"in","x","same.emf"),
+               os.path.join(tmp,"in","y","same.emf")],'convert',out,workers=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("duplicate output names")
+
+    # a file that can't be written is reported as an error
+    os.makedirs(os.path.join(tmp,"blocked","same.emf"))
+    report=batch([os.path.join(tmp,"in","x","same.emf")],'convert',
+                 os.path.join(tmp,"blocked"),workers=1)
+    assert report.errors==1 and report.results[0]['error']
+finally:
+    shutil.rmtree(tmp)
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+# Test of merging runs of polylines and polygons into polypolylines and
+# polypolygons.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import struct
+import pyemf
+from pyemf import emr
+from pyemf.optimize import coalesce
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+# five lines, then five polygons that are apart, are each merged
+for i in range(5):
+    emf.Polyline([(0,i*10),(width*dpi,i*10+5)])
+for i in range(5):
+    emf.Polygon([(i*20,0),(i*20+10,0),(i*20+10,10)])
+# a polygon overlapping one in the run starts a new run
+emf.Polygon([(0,100),(50,100),(50,150)])
+emf.Polygon([(40,100),(90,100),(90,150)])
+ret=emf.save("test-coalesce.emf")
+
+out=list(coalesce(emf.records))
+names=[e.__class__.__name__ for e in out]
+assert names==['_HEADER','_CREATEPEN','_SELECTOBJECT','_POLYPOLYLINE16',
+               '_POLYPOLYGON16','_POLYGON16','_EOF'],names
+assert list(out[3].aPolyCounts)==[2,2,2,2,2] and out[3].nPolys==5
+assert list(out[4].aPolyCounts)==[3,3,3,3,3,3]
+assert [list(p) for p in out[4].aptl][3:6]==[[20,0],[30,0],[30,10]]
+# points beyond 16 bits make a 32 bit record
+emf=pyemf.EMF(width,height,dpi)
+emf.Polyline([(0,0),(100000,10)])
+emf.Polyline([(0,0),(10,10)])
+out=list(coalesce(emf.records))
+assert out[1].__class__ is emr._POLYPOLYLINE and out[1].nPolys==2
+
+# with a wide pen, the outline of one polygon would cross into the
+# other, so they are kept apart; after RestoreDC the thin pen is back
+# and the same polygons are merged
+emf=pyemf.EMF(width,height,dpi)
+thin=emf.CreatePen(pyemf.PS_SOLID,1,(0,0,0))
+wide=emf.CreatePen(pyemf.PS_SOLID,10,(0,0,0))
+emf.SelectObject(thin)
+emf.SaveDC()
+emf.SelectObject(wide)
+emf.Polygon([(0,0),(10,0),(10,10)])
+emf.Polygon([(15,0),(25,0),(25,10)])
+emf.RestoreDC(-1)
+emf.Polygon([(0,0),(10,0),(10,10)])
+emf.Polygon([(15,0),(25,0),(25,10)])
+# the stock pens are known too
+emf.SelectObject(emf.GetStockObject(pyemf.NULL_PEN))
+emf.Polygon([(0,0),(10,0),(10,10)])
+emf.Polygon([(11,0),(25,0),(25,10)])
+emf.save("test-coalesce-pen.emf")
+out=list(coalesce(emf.records))
+names=[e.__class__.__name__ for e in out]
+assert names[6:]==['_POLYGON16','_POLYGON16','_RESTOREDC','_POLYPOLYGON16',
+                   '_SELECTOBJECT','_POLYPOLYGON16','_EOF'],names
+
+# the width of an extended pen is read from its raw data, and a pen
+# that isn't known keeps polygons apart
+records=list(emf.records[:3])
+extended=emr._EXTCREATEPEN()
+extended.handle=3
+extended.unhandleddata=struct.pack("<7i",0,0,0,0,pyemf.PS_GEOMETRIC,10,0)
+records.append(extended)
+for handle in (3,thin,99):
+    records.append(emr._SELECTOBJECT(handle=handle))
+    records.append(emr._POLYGON16([(0,0),(10,0),(10,10)],[[0,0],[10,10]]))
+    records.append(emr._POLYGON16([(15,0),(25,0),(25,10)],[[15,0],[25,10]]))
+out=list(coalesce(records))
+names=[e.__class__.__name__ for e in out]
+assert names[4:]==['_SELECTOBJECT','_POLYGON16','_POLYGON16',
+                   '_SELECTOBJECT','_POLYPOLYGON16',
+                   '_SELECTOBJECT','_POLYGON16','_POLYGON16'],names
+
+# a merged file still loads
+emf=pyemf.EMF()
+emf.load("test-coalesce.emf")
+removed=emf.optimize()
+assert removed==9
+emf.save("test-coalesce-merged.emf")
+emf=pyemf.EMF()
+emf.load("test-coalesce-merged.emf")
+assert emf.records[4].nPolys==6
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# Test of writing and reading gzip compressed metafiles.
+
+from __future__ import print_function
+from builtins import str
+import io
+import pyemf
+from pyemf.wmf import WMF
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+ret=emf.save("test-compressed.emf")
+# what loading gives back, header included
+emf=pyemf.EMF()
+emf.load("test-compressed.emf")
+plain=emf.tobytes()
+
+# by name
+emf.save("test-compressed.emz")
+assert open("test-compressed.emz","rb").read(2)==b'\x1f\x8b'
+emf=pyemf.EMF()
+emf.load("test-compressed.emz")
+assert emf.tobytes()==plain
+
+# into a file object
+fh=io.BytesIO()
+emf.save(fh,compresslevel=9)
+data=fh.getvalue()
+assert data[:2]==b'\x1f\x8b'
+emf=pyemf.EMF()
+emf.loadmem(data)
+assert emf.tobytes()==plain
+
+# compressed file objects are recognized by their contents too
+records=len(emf.records)
+fh=io.BytesIO(data)
+assert pyemf.probe(fh).nRecords==records
+fh=io.BytesIO(data)
+assert len(list(pyemf.iterRecords(fh)))==records
+fh=open("test-compressed.emz","rb")
+assert pyemf.probe(fh).nRecords==records
+fh.close()
+fh=open("test-compressed.emz","rb")
+assert len(list(pyemf.iterRecords(fh)))==records
+fh.close()
+# and a plain one is still read from where it is
+fh=open("test-compressed.emf","rb")
+assert pyemf.probe(fh).nRecords==records
+fh.close()
+
+# a file that can't be written is a failure whether compressed or not
+for name in ("test-compressed-missing/x.emf","test-compressed-missing/x.emz"):
+    assert emf.save(name) is False
+    assert emf.save(name,compresslevel=1) is False
+wmf=WMF(width,height,dpi)
+assert wmf.save("test-compressed-missing/x.wmf") is False
+assert wmf.save("test-compressed-missing/x.wmz") is False
+
+print("save returns %s" % str(ret))
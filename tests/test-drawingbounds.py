@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Test of the running drawing bounds and of fitting the header to them.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+
+width=8
+height=6
+dpi=100
+
+# the bounds follow a record list that was replaced, even once it is
+# back to its old length
+emf=pyemf.EMF(width,height,dpi)
+for i in range(10):
+    emf.Polyline([(0,0),(10,10)])
+emf.optimize()
+for i in range(9):
+    emf.Polyline([(500,500),(600,600)])
+assert emf.getDrawingBounds()==((0,0),(600,600))
+emf.records=emf.records[:1]
+for i in range(9):
+    emf.Polyline([(200,200),(300,300)])
+assert emf.getDrawingBounds()==((200,200),(300,300))
+assert len(emf.recordsInRect(((0,0),(100,100))))==0
+
+# later calls take in what was drawn since the last one
+emf.Polyline([(250,100),(250,150)])
+assert emf.getDrawingBounds()==((200,100),(300,300))
+
+# a streamed file is fitted too when fitheader is set before streaming
+emf=pyemf.EMF(width,height,dpi)
+emf.fitheader=True
+emf.Polyline([(30,40),(50,60)])
+emf.stream("test-drawingbounds-stream.emf")
+emf.Polyline([(70,20),(80,30)])
+emf.close()
+emf=pyemf.EMF()
+emf.load("test-drawingbounds-stream.emf")
+assert emf.records[0].rclBounds==[[30,20],[80,60]]
+
+# text and pixels count too: text by its reference point, or with a
+# font selected by an estimate of its extent
+emf=pyemf.EMF(width,height,dpi)
+emf.TextOut(300,250,"text")
+emf.Polyline([(10,10),(20,20)])
+emf.SetPixel(5,400,(0,0,0))
+assert emf.getDrawingBounds()==((5,10),(300,400))
+font=emf.CreateFont(-20)
+emf.SelectObject(font)
+emf.SetTextAlign(pyemf.TA_BASELINE)
+emf.TextOut(500,100,"more")
+drawn=emf.getDrawingBounds()
+# four characters of an em each to the right, on a baseline at 100
+assert drawn[0]==(5,10) and drawn[1][0]>=580 and drawn[1][1]==400
+emf.fitheader=True
+emf.save("test-drawingbounds-text.emf")
+emf=pyemf.EMF()
+emf.load("test-drawingbounds-text.emf")
+assert emf.records[0].rclBounds==[[5,10],[drawn[1][0],400]]
+
+# fractional coordinates are rounded outwards in the header
+emf=pyemf.EMF(width,height,dpi)
+emf.fitheader=True
+emf.Rectangle(10.5,20.5,100.2,50.7)
+ret=emf.save("test-drawingbounds.emf")
+emf=pyemf.EMF()
+emf.load("test-drawingbounds.emf")
+assert emf.records[0].rclBounds==[[10,20],[101,51]]
+
+print("save returns %s" % str(ret))
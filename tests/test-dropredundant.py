@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# Test of which records optimize() drops as redundant state changes.
+
+from __future__ import print_function
+from builtins import str
+import pyemf
+from pyemf import emr
+
+width=4
+height=3
+dpi=100
+
+# test--run-all.py runs this with exec, where functions can't see the
+# names defined here, so this one imports what it needs
+def kept(emf):
+    from pyemf.optimize import dropRedundant
+    result=[]
+    for e in dropRedundant(emf.records):
+        name=e.__class__.__name__.lstrip('_')
+        if name in ('SELECTOBJECT','DELETEOBJECT','CREATEPEN'):
+            name+='(%d)' % e.handle
+        elif name=='RESTOREDC':
+            name+='(%d)' % e.iRelative
+        elif name=='SETBKMODE':
+            name+='(%d)' % e.iMode
+        result.append(name)
+    return result[1:]
+
+# selecting the selected object again
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.SelectObject(pen)
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(10,10)])
+emf.SelectObject(pen)
+assert kept(emf)==['CREATEPEN(1)','SELECTOBJECT(1)','POLYLINE16']
+
+# a handle that was deleted and reused is a new object
+emf.DeleteObject(pen)
+pen2=emf.CreatePen(pyemf.PS_DASH,1,(0,0xff,0))
+assert pen2==pen
+emf.SelectObject(pen2)
+assert kept(emf)[3:]==['DELETEOBJECT(1)','CREATEPEN(1)','SELECTOBJECT(1)']
+
+# nested SaveDC/RestoreDC: empty pairs go, the others stay, and the
+# state comes back on restore
+emf=pyemf.EMF(width,height,dpi)
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+green=emf.CreatePen(pyemf.PS_SOLID,1,(0,0xff,0))
+emf.SelectObject(red)
+emf.SaveDC()
+emf.SaveDC()
+emf.RestoreDC(-1)
+emf.RestoreDC(-1)
+emf.SaveDC()
+emf.SelectObject(green)
+emf.SaveDC()
+emf.RestoreDC(-1)
+emf.RestoreDC(-1)
+emf.SelectObject(red)
+emf.SelectObject(green)
+assert kept(emf)==['CREATEPEN(1)','CREATEPEN(2)','SELECTOBJECT(1)',
+                   'SAVEDC','SELECTOBJECT(2)','RESTOREDC(-1)',
+                   'SELECTOBJECT(2)']
+
+# RestoreDC to other than the last state is always kept, and goes back
+# to the state it names
+emf=pyemf.EMF(width,height,dpi)
+emf.SetBkMode(pyemf.TRANSPARENT)
+emf.SaveDC()
+emf.SetBkMode(pyemf.OPAQUE)
+emf.SaveDC()
+emf.records.append(emr._RESTOREDC(-2))
+emf.SetBkMode(pyemf.TRANSPARENT)
+emf.SetBkMode(pyemf.OPAQUE)
+# there is only one saved state, so nothing is known after this one
+emf.SaveDC()
+emf.records.append(emr._RESTOREDC(-2))
+emf.SetBkMode(pyemf.OPAQUE)
+assert kept(emf)==['SETBKMODE(%d)' % pyemf.TRANSPARENT,'SAVEDC',
+                   'SETBKMODE(%d)' % pyemf.OPAQUE,'SAVEDC','RESTOREDC(-2)',
+                   'SETBKMODE(%d)' % pyemf.OPAQUE,'SAVEDC','RESTOREDC(-2)',
+                   'SETBKMODE(%d)' % pyemf.OPAQUE]
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.SelectObject(pen)
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+assert emf.optimize()==1
+ret=emf.save("test-dropredundant.emf")
+print("save returns %s" % str(ret))
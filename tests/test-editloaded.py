@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+# Test that changes to loaded records are saved, and that reading them
+# doesn't stop unchanged records from being copied verbatim.
+
+from __future__ import print_function
+from builtins import str
+import pyemf
+from pyemf.wmf import WMF
+
+width=4
+height=3
+dpi=100
+
+# text records keep the string outside their typedef fields
+wmf=WMF(width,height,dpi)
+wmf.TextOut(10,10,b'hello!')
+wmf.save("test-editloaded.wmf")
+
+wmf=WMF()
+wmf.load("test-editloaded.wmf")
+text=[e for e in wmf.records if e.__class__.__name__=='META_EXTTEXTOUT'][0]
+text.string=b'HELLO!'
+wmf.save("test-editloaded.wmf")
+data=open("test-editloaded.wmf","rb").read()
+assert b'HELLO!' in data and b'hello!' not in data
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+emf.Rectangle(10,10,100,50)
+ret=emf.save("test-editloaded.emf")
+
+emf=pyemf.EMF()
+emf.load("test-editloaded.emf")
+emf.getDrawingBounds()
+emf.recordsInRect(((0,0),(50,50)))
+# the header is always written again, with the new bounds
+clean=[e for e in emf.records[1:] if e.original() is not None]
+assert len(clean)==len(emf.records)-1
+
+print("save returns %s" % str(ret))
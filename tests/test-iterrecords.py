@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+# Test of reading records one at a time with iterRecords.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+for i in range(5):
+    emf.Polyline([(0,i*10),(width*dpi,i*10)])
+ret=emf.save("test-iterrecords.emf")
+
+loaded=pyemf.EMF()
+loaded.load("test-iterrecords.emf")
+names=[e.__class__.__name__ for e in pyemf.iterRecords("test-iterrecords.emf")]
+assert names==[e.__class__.__name__ for e in loaded.records]
+lines=list(pyemf.iterRecords("test-iterrecords.emf",
+                             include=pyemf.emr._POLYLINE16))
+assert [e.__class__.__name__ for e in lines].count('_POLYLINE16')==5
+
+print("save returns %s" % str(ret))
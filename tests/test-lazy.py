@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Test that a lazily loaded file is saved again without decoding its
+# records, and that only a changed record is packed again.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+for i in range(5):
+    emf.Polyline([(0,i*10),(width*dpi,i*10)])
+emf.Rectangle(10,10,100,50)
+emf.TextOut(20,100,"lazy")
+ret=emf.save("test-lazy.emf")
+original=open("test-lazy.emf","rb").read()
+
+emf=pyemf.EMF()
+emf.load("test-lazy.emf",lazy=True)
+lazy=[e for e in emf.records if '_lazy' in e.__dict__]
+# the header and the pen creation are always decoded
+assert len(lazy)==len(emf.records)-2
+
+# an untouched load and save is a copy, and decodes nothing; only the
+# header is written again, with the frame worked out from the bounds
+header=emf.records[0].nSize
+first=emf.tobytes()
+assert first[header:]==original[header:]
+assert emf.tobytes()==first
+original=first
+assert len([e for e in emf.records if '_lazy' in e.__dict__])==len(lazy)
+
+# a changed record is packed again, and nothing else changes
+offset=0
+for e in emf.records:
+    if e.__class__.__name__=='_RECTANGLE':
+        rect=e
+        break
+    offset+=e.nSize
+rect.rclBox=[[20,20],[110,60]]
+data=emf.tobytes()
+assert len(data)==len(original)
+assert data[:offset]==original[:offset]
+assert data[offset+rect.nSize:]==original[offset+rect.nSize:]
+assert data[offset:offset+rect.nSize]!=original[offset:offset+rect.nSize]
+assert len([e for e in emf.records if '_lazy' in e.__dict__])==len(lazy)-1
+
+emf=pyemf.EMF()
+emf.loadmem(data)
+assert [e for e in emf.records if e.__class__.__name__=='_RECTANGLE'][0].rclBox==[[20,20],[110,60]]
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Test of sharing pens, brushes and fonts with objectbudget.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+def created(emf):
+    return [e for e in emf.records if e.__class__.__name__=='_CREATEPEN']
+
+def deleted(emf):
+    return [e.handle for e in emf.records
+            if e.__class__.__name__=='_DELETEOBJECT']
+
+# without a budget every call makes a new object
+emf=pyemf.EMF(width,height,dpi)
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+assert emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))!=red
+
+# the same parameters give the same handle, and deleting it writes
+# nothing while the cache owns it
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+for i in range(10):
+    assert emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))==red
+    emf.SelectObject(red)
+    emf.Polyline([(0,i*10),(width*dpi,i*10)])
+    emf.DeleteObject(red)
+assert len(created(emf))==1 and deleted(emf)==[]
+font=emf.CreateFont(-12)
+assert emf.CreateFont(-12)==font
+emf.SelectObject(font)
+assert emf.CreateFont(-14) not in (font,red)
+
+# over budget the least recently used object is deleted and its handle
+# reused; an earlier handle may then refer to another object
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+handles=[]
+for color in [(0xff,0,0),(0,0xff,0),(0xff,0,0),(0,0,0xff),(0xff,0xff,0)]:
+    handles.append(emf.CreatePen(pyemf.PS_SOLID,1,color))
+assert handles==[1,2,1,2,1]
+assert deleted(emf)==[2,1]
+assert len(created(emf))==4
+
+# objects that are selected, or selected in a saved state, are kept
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.SelectObject(red)
+emf.SaveDC()
+green=emf.CreatePen(pyemf.PS_SOLID,1,(0,0xff,0))
+emf.SelectObject(green)
+blue=emf.CreatePen(pyemf.PS_SOLID,1,(0,0,0xff))
+assert deleted(emf)==[] and blue not in (red,green)
+emf.RestoreDC(-1)
+yellow=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0xff,0))
+# red is selected again; green and blue are not
+assert red not in deleted(emf)
+assert yellow in (green,blue)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+
+ret=emf.save("test-objectcache.emf")
+
+# loading replaces the objects behind the handles, so the cache starts
+# again rather than handing out a handle that is now another pen
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.load("test-objectcache.emf")
+before=len(created(emf))
+emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+assert len(created(emf))==before+1
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.loadmem(open("test-objectcache.emf","rb").read())
+emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+assert len(created(emf))==before+1
+
+# and so does appending to a file
+emf=pyemf.EMF(width,height,dpi)
+emf.objectbudget=2
+red=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.append("test-objectcache.emf")
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0xff,0,0))
+emf.SelectObject(pen)
+emf.Polyline([(0,height*dpi),(width*dpi,0)])
+assert emf.close()
+emf=pyemf.EMF()
+emf.load("test-objectcache.emf")
+assert len(created(emf))==before+1
+assert emf.records[-4].handle==pen
+
+print("save returns %s" % str(ret))
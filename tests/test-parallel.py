@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+# Test that loading with worker processes gives the same records as a
+# serial load.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+from pyemf import emr
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+for i in range(200):
+    emf.Polyline([(0,i),(width*dpi,i)])
+    if i%20==0:
+        brush=emf.CreateSolidBrush((i,0,0))
+        emf.SelectObject(brush)
+        emf.Rectangle(i,i,i+10,i+10)
+        emf.DeleteObject(brush)
+emf.TextOut(10,10,"parallel")
+ret=emf.save("test-parallel.emf")
+
+serial=pyemf.EMF()
+serial.load("test-parallel.emf")
+parallel=pyemf.EMF()
+parallel.load("test-parallel.emf",workers=2)
+assert len(parallel.records)==len(serial.records)
+assert parallel.tobytes()==serial.tobytes()
+assert len(parallel.dc.objects)==len(serial.dc.objects)
+
+# the type filters are applied by the workers too
+serial=pyemf.EMF()
+serial.load("test-parallel.emf",include=[emr._RECTANGLE])
+parallel=pyemf.EMF()
+parallel.load("test-parallel.emf",include=[emr._RECTANGLE],workers=2)
+names=[e.__class__.__name__ for e in parallel.records]
+assert names==[e.__class__.__name__ for e in serial.records]
+assert names.count('_RECTANGLE')==10 and '_POLYLINE16' not in names
+
+parallel=pyemf.EMF()
+parallel.load("test-parallel.emf",exclude=[emr._POLYLINE16],
+              placeholders=True,workers=2)
+assert len(parallel.records)==len(emf.records)
+assert parallel.tobytes()[parallel.records[0].nSize:]==\
+    open("test-parallel.emf","rb").read()[parallel.records[0].nSize:]
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# Test of rewriting single records in place with patch().
+
+from __future__ import print_function
+from builtins import str
+import pyemf
+from pyemf.utils import RGB
+from pyemf.wmf import WMF
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+ret=emf.save("test-patch.emf")
+
+# after load: change the pen color of the loaded record
+emf=pyemf.EMF()
+emf.load("test-patch.emf")
+emf.records[1].lopn_color=RGB(0x10,0x20,0x30)
+emf.patch(1)
+emf=pyemf.EMF()
+emf.load("test-patch.emf")
+assert emf.records[1].lopn_color==RGB(0x10,0x20,0x30)
+
+# after loadIndex: the replacement record has to be given
+emf=pyemf.EMF()
+emf.loadIndex("test-patch.emf")
+try:
+    emf.patch(1)
+except ValueError:
+    pass
+else:
+    raise AssertionError("patch without a record after loadIndex")
+e=emf.record(1)
+e.lopn_color=RGB(0x01,0x02,0xff)
+emf.patch(1,e)
+assert emf.index.isCurrent()
+emf=pyemf.EMF()
+emf.load("test-patch.emf")
+assert emf.records[1].lopn_color==RGB(0x01,0x02,0xff)
+
+# a size change can't be patched
+e=emf.records[3]
+e.aptl=list(e.aptl)+[(0,0)]
+e.cptl=3
+try:
+    emf.patch(3)
+except ValueError:
+    pass
+else:
+    raise AssertionError("patch that changes the record size")
+
+# relabel a WMF text record
+wmf=WMF(width,height,dpi)
+wmf.TextOut(10,10,b'label1')
+wmf.save("test-patch.wmf")
+wmf=WMF()
+wmf.load("test-patch.wmf")
+text=[i for i,e in enumerate(wmf.records)
+      if e.__class__.__name__=='META_EXTTEXTOUT'][0]
+wmf.records[text].string=b'label2'
+wmf.patch(text)
+wmf=WMF()
+wmf.load("test-patch.wmf")
+assert wmf.records[text].string==b'label2'
+
+print("save returns %s" % str(ret))
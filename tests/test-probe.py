@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+# Test of reading the headers of metafiles with probe().
+
+from __future__ import print_function
+from builtins import str
+import pyemf
+from pyemf.wmf import WMF
+
+width=4
+height=3
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi,description="probed")
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+ret=emf.save("test-probe.emf")
+data=open("test-probe.emf","rb").read()
+
+info=pyemf.probe("test-probe.emf")
+assert not info.wmf and info.filename=="test-probe.emf"
+assert info.nBytes==len(data) and info.nRecords==len(emf.records)
+assert info.nHandles==2 and info.description.endswith(u"probed")
+assert info.bounds==[[0,0],[width*dpi,height*dpi]]
+# buffers and file objects give the same answer
+assert pyemf.probe(data).nBytes==len(data)
+fh=open("test-probe.emf","rb")
+assert pyemf.probe(fh).nRecords==info.nRecords
+fh.close()
+
+wmf=WMF(width,height,dpi)
+wmf.TextOut(10,10,b'probed')
+wmf.save("test-probe.wmf")
+wmfdata=open("test-probe.wmf","rb").read()
+info=pyemf.probe("test-probe.wmf")
+assert info.wmf and info.placeable is not None
+# WMF.save counts the placeable header in the size
+assert info.nBytes==len(wmfdata)
+assert info.bounds==[[0,0],[width*dpi,height*dpi]]
+
+# a truncated header, and something that isn't a metafile at all
+for bad,error in ((data[:40],EOFError),(data[:4],EOFError),
+                  (wmfdata[:30],EOFError),
+                  (b"this is certainly not a metafile",ValueError),
+                  (b"\1\0\0\0"+data[4:40]+b"\0"*100,ValueError)):
+    try:
+        pyemf.probe(bad)
+    except error:
+        pass
+    else:
+        assert False,"probe accepted %r" % bad[:16]
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+# Test that the compiled record codecs, which pack fixed size fields
+# like rclBounds in a single struct, read and write the same bytes as
+# the field by field code.
+
+from __future__ import print_function
+from builtins import str
+import copy
+import pyemf
+from pyemf import emr
+from pyemf.record import RecordFormat
+from pyemf.wmf import WMF
+
+width=4
+height=3
+dpi=100
+
+# fixed count fields are part of the compiled runs
+segments=emr._POLYLINE16().format.segments
+assert 'rclBounds' in segments[0][1] and 'cptl' in segments[0][1]
+segments=emr._HEADER().format.segments
+assert 'rclBounds' in segments[0][1] and 'rclFrame' in segments[0][1]
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+emf.Polyline([(0,0),(width*dpi,height*dpi)])
+emf.Polyline([(0,0),(100000,10)])
+emf.PolyPolygon([[(0,0),(10,10),(0,10)],[(20,20),(30,30),(20,30)]])
+emf.Rectangle(10,10,100,50)
+emf.Arc(10,10,100,50,0,0,100,0)
+emf.SetWorldTransform(1.5,0,0,1.5,10,10)
+emf.TextOut(20,100,"compiled")
+ret=emf.save("test-recordformat.emf")
+
+wmf=WMF(width,height,dpi)
+wmf.TextOut(10,10,b'compiled')
+wmf.save("test-recordformat.wmf")
+
+for filename,doc in (("test-recordformat.emf",pyemf.EMF()),
+                     ("test-recordformat.wmf",WMF())):
+    doc.load(filename)
+    data=open(filename,"rb").read()
+    ptr=0
+    for e in doc.records:
+        size=e.nSize
+        raw=data[ptr:ptr+size]
+        ptr+=size
+        if size==0:
+            continue
+        compiled=e.format
+        generic=RecordFormat(e.typedef)
+        generic.segments=None
+        hdrlen=e.hdrLen()
+        # both decode the record the same way...
+        a=e.__class__()
+        compiled.unpack(raw,a,hdrlen)
+        b=e.__class__()
+        generic.unpack(raw,b,hdrlen)
+        assert a.values==b.values,(e.__class__.__name__,a.values,b.values)
+        # ...and pack it back to the bytes it was read from
+        packed=compiled.pack(copy.deepcopy(a.values),a,hdrlen)
+        assert packed==generic.pack(copy.deepcopy(b.values),b,hdrlen)
+        assert packed==raw[hdrlen:hdrlen+len(packed)],e.__class__.__name__
+
+print("save returns %s" % str(ret))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# Test of Douglas-Peucker simplification of lines and polygons, both of
+# point lists and of the records in a metafile.
+
+from __future__ import print_function
+from builtins import str
+import sys
+import pyemf
+from pyemf.simplify import simplify, simplifyParts
+
+width=4
+height=3
+dpi=100
+
+# collinear points are dropped, the ends and the corner are kept
+line=[(0,0),(1,0),(2,0),(3,0),(3,1),(3,2),(3,3)]
+assert simplify(line,0.5)==[(0,0),(3,0),(3,3)]
+# points within the tolerance of the line are dropped, further ones kept
+assert simplify([(0,0),(5,0.3),(10,0)],0.5)==[(0,0),(10,0)]
+assert simplify([(0,0),(5,0.7),(10,0)],0.5)==[(0,0),(5,0.7),(10,0)]
+# a tolerance of zero or less changes nothing
+for tolerance in (0,-1):
+    assert simplify(line,tolerance) is line
+
+# a polygon is never reduced below three points
+triangle=[(0,0),(10,1),(20,0)]
+assert simplify(triangle,5)==[(0,0),(20,0)]
+assert simplify(triangle,5,True) is triangle
+ring=[(0,0),(5,0),(10,0),(10,5),(10,10),(0,10),(0,5)]
+assert simplify(ring,0.5,True)==[(0,0),(10,0),(10,10),(0,10),(0,5)]
+
+# each part is simplified on its own, and the counts follow
+points=line+[(10,10),(20,20)]+triangle
+(kept,counts)=simplifyParts(points,[7,2,3],1)
+assert counts==[3,2,2]
+assert kept==[(0,0),(3,0),(3,3),(10,10),(20,20),(0,0),(20,0)]
+(kept,counts)=simplifyParts(points,[7,2,3],1,True)
+assert counts==[3,2,3] and kept[-3:]==triangle
+(kept,counts)=simplifyParts(points,[7,2,3],0)
+assert kept is points and counts==[7,2,3]
+
+# numpy arrays stay arrays, and give the same points as the pure
+# Python version
+simplifymodule=sys.modules['pyemf.simplify']
+if simplifymodule.numpy is not None:
+    numpy=simplifymodule.numpy
+    kept=simplify(numpy.array(line),0.5)
+    assert isinstance(kept,numpy.ndarray)
+    assert kept.tolist()==[[0,0],[3,0],[3,3]]
+    (kept,counts)=simplifyParts(numpy.array(points),[7,2,3],1)
+    assert kept.tolist()==[[0,0],[3,0],[3,3],[10,10],[20,20],[0,0],[20,0]]
+    simplifymodule.numpy=None
+    try:
+        assert simplify(line,0.5)==[(0,0),(3,0),(3,3)]
+        assert simplify(ring,0.5,True)==[(0,0),(10,0),(10,10),(0,10),(0,5)]
+        assert simplifyParts(points,[7,2,3],1,True)[1]==[3,2,3]
+    finally:
+        simplifymodule.numpy=numpy
+
+# simplifying a loaded metafile
+emf=pyemf.EMF(width,height,dpi)
+emf.Polyline(line)
+emf.Polygon(ring)
+emf.Polygon(triangle)
+emf.PolyPolyline([line,[(10,10),(20,20)]])
+ret=emf.save("test-simplify.emf")
+original=open("test-simplify.emf","rb").read()
+
+emf=pyemf.EMF()
+emf.load("test-simplify.emf")
+assert emf.simplify(0)==0
+assert emf.tobytes()[emf.records[0].nSize:]==original[emf.records[0].nSize:]
+assert emf.simplify(1)==4+2+4
+emf.save("test-simplify-out.emf")
+emf=pyemf.EMF()
+emf.load("test-simplify-out.emf")
+lines=[]
+for e in emf.records[1:-1]:
+    lines.append([list(p) for p in e.aptl])
+assert lines[0]==[[0,0],[3,0],[3,3]]
+assert lines[1]==[[0,0],[10,0],[10,10],[0,10],[0,5]]
+assert lines[2]==[[0,0],[10,1],[20,0]]
+assert lines[3]==[[0,0],[3,0],[3,3],[10,10],[20,20]]
+assert list(emf.records[4].aPolyCounts)==[3,2]
+
+# simplifying as the lines are drawn
+emf=pyemf.EMF(width,height,dpi)
+emf.simplifytolerance=1
+emf.Polyline(line)
+emf.Polygon(ring)
+emf.Polygon(triangle)
+emf.PolyPolyline([line,[(10,10),(20,20)]])
+assert len(emf.records[1].aptl)==3 and len(emf.records[2].aptl)==5
+assert len(emf.records[3].aptl)==3
+assert list(emf.records[4].aPolyCounts)==[3,2]
+# and with a tolerance of zero, nothing changes
+emf=pyemf.EMF(width,height,dpi)
+emf.simplifytolerance=0
+emf.Polyline(line)
+emf.Polygon(ring)
+emf.Polygon(triangle)
+emf.PolyPolyline([line,[(10,10),(20,20)]])
+emf.save("test-simplify-zero.emf")
+assert open("test-simplify-zero.emf","rb").read()==original
+
+print("save returns %s" % str(ret))
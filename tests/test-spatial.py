@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+# Test of finding the records in a rectangle with recordsInRect.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import pyemf
+
+width=8
+height=6
+dpi=100
+
+emf=pyemf.EMF(width,height,dpi)
+pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+emf.SelectObject(pen)
+for i in range(10):
+    emf.Polyline([(i*50,0),(i*50+40,40)])
+# fractional coordinates are accepted by the builder, so by the index too
+emf.Polyline([(0.5,100.5),(10.2,120.7)])
+emf.Rectangle(100.5,100,200,300.5)
+# text is found by its reference point, or by its extent once a font
+# is selected, and a pixel by its point
+emf.TextOut(600,500,"point")
+font=emf.CreateFont(-20)
+emf.SelectObject(font)
+emf.TextOut(600,400,"extent")
+emf.SetPixel(700,50,(0,0,0))
+
+found=emf.recordsInRect(((60,10),(110,20)))
+assert [e.getBounds()[0][0] for e in found]==[50,100]
+found=emf.recordsInRect(((0,100),(5,105)))
+assert len(found)==1 and found[0].__class__.__name__.startswith('_POLYLINE')
+assert len(emf.recordsInRect(((200.2,300.2),(201,301))))==0
+assert len(emf.recordsInRect(((199.5,300),(201,301))))==1
+found=emf.recordsInRect(((595,495),(605,505)))
+assert len(found)==1 and found[0].ptlReference_y==500
+found=emf.recordsInRect(((650,410),(660,415)))
+assert len(found)==1 and found[0].ptlReference_y==400
+found=emf.recordsInRect(((690,40),(710,60)))
+assert len(found)==1 and found[0].__class__.__name__=='_SETPIXELV'
+found=emf.recordsInRect(((0,0),(10,10)),unbounded=True)
+assert [e.__class__.__name__ for e in found][:4]==['_HEADER','_CREATEPEN','_SELECTOBJECT','_POLYLINE16']
+
+ret=emf.save("test-spatial.emf")
+print("save returns %s" % str(ret))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Test that a streamed file is the same as one saved from memory.
+
+from __future__ import print_function
+from builtins import str
+from builtins import range
+import struct
+import pyemf
+
+width=4
+height=3
+dpi=100
+
+# the same drawing is made three times: kept in memory, streamed, and
+# streamed through the optimizer stages
+emfs=[]
+for i in range(3):
+    emfs.append(pyemf.EMF(width,height,dpi))
+emfs[1].Rectangle(0,0,10,10)
+emfs[1].stream("test-stream.emf")
+emfs[2].Rectangle(0,0,10,10)
+emfs[2].stream("test-stream-optimized.emf",coalesce=True,redundant=True)
+emfs[0].Rectangle(0,0,10,10)
+for emf in emfs:
+    pen=emf.CreatePen(pyemf.PS_SOLID,1,(0x01,0x02,0xff))
+    emf.SelectObject(pen)
+    for i in range(20):
+        emf.Polyline([(0,i*10),(width*dpi,i*10+5)])
+        emf.SelectObject(pen)
+    emf.SaveDC()
+    emf.RestoreDC(-1)
+    emf.Polygon([(0,0),(10,0),(10,10)])
+    emf.Polygon([(20,0),(30,0),(30,10)])
+    emf.TextOut(10,10,"streamed")
+assert emfs[1].records==[]
+ret=emfs[0].save("test-stream-memory.emf")
+assert emfs[1].close() and emfs[2].save()
+assert not emfs[1].close()
+
+memory=open("test-stream-memory.emf","rb").read()
+streamed=open("test-stream.emf","rb").read()
+assert streamed==memory
+# the size and record count were filled in at the end
+(nBytes,nRecords)=struct.unpack("<ii",streamed[48:56])
+assert nBytes==len(streamed) and nRecords==len(emfs[0].records)
+
+# streaming through the optimizer stages gives the same file as
+# optimizing in memory
+emf=pyemf.EMF()
+emf.load("test-stream-memory.emf")
+removed=emf.optimize()
+assert removed>0
+optimized=open("test-stream-optimized.emf","rb").read()
+header=emf.records[0].nSize
+assert optimized[header:]==emf.tobytes()[header:]
+(nBytes,nRecords)=struct.unpack("<ii",optimized[48:56])
+assert nBytes==len(optimized) and nRecords==len(emf.records)
+
+emfs[0].save("test-stream.emf")
+print("save returns %s" % str(ret))